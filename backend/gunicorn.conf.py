@@ -0,0 +1,55 @@
+"""Gunicorn settings for serving the API in production.
+
+    cd backend && gunicorn -c gunicorn.conf.py src.wsgi:app
+
+The app is built once in the master (preload) and forked into GITEASY_WORKERS
+processes of GITEASY_THREADS threads each. Each worker drops the database
+connections it inherited and starts its own background job threads after the
+fork. Workers are recycled after GITEASY_MAX_REQUESTS requests (with jitter so
+they don't all restart together); ``kill -HUP <master pid>`` replaces all
+workers gracefully. With preload on, HUP reuses the already-loaded code, so
+deploy new code with USR2 followed by TERM to the old master, or set
+GITEASY_PRELOAD=0.
+
+An open /events stream (Server-Sent Events) holds one of a worker's threads
+for as long as it is connected. Each worker therefore accepts at most
+GITEASY_SSE_MAX_SUBSCRIBERS streams, half of GITEASY_THREADS by default, and
+answers further ones with 503 so that the other threads stay free for API
+requests. Streams are closed after GITEASY_SSE_MAX_SECONDS (300) and browsers
+reconnect on their own. Raise GITEASY_THREADS along with the cap if more
+dashboards need to be open at once.
+"""
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+bind = os.environ.get('GITEASY_BIND', '0.0.0.0:5000')
+workers = _env_int('GITEASY_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8))
+worker_class = 'gthread'
+threads = _env_int('GITEASY_THREADS', 8)
+preload_app = os.environ.get('GITEASY_PRELOAD', '1') != '0'
+
+# Clones and pushes can legitimately take minutes when not run as jobs
+timeout = _env_int('GITEASY_WORKER_TIMEOUT', 300)
+graceful_timeout = _env_int('GITEASY_GRACEFUL_TIMEOUT', 60)
+keepalive = 5
+max_requests = _env_int('GITEASY_MAX_REQUESTS', 5000)
+max_requests_jitter = max_requests // 10
+if os.path.isdir('/dev/shm'):
+    # Heartbeat files on tmpfs, so a slow disk can't make workers look hung
+    worker_tmp_dir = '/dev/shm'
+
+# Job threads are started per worker in post_worker_init, not in the master
+os.environ.setdefault('GITEASY_DEFER_BACKGROUND', '1')
+
+
+def post_worker_init(worker):
+    from src.main import init_worker
+    from src.wsgi import app
+
+    init_worker(app)
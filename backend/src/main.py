@@ -3,52 +3,92 @@ import sys
 # DON\'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, current_app, request
 from flask_cors import CORS
-from src.models import db # Changed import path for db
-from src.models.repository import Repository, FileChange, CommitHistory
-from src.routes.user import user_bp
-from src.routes.git_routes import git_bp
-from src.routes.auth_routes import auth_bp
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-# Enable CORS for all routes
-CORS(app)
-
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(git_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api')
-
-# uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-with app.app_context():
-    db.create_all()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
+
+def create_app(config=None):
+    """Build and configure the Flask application.
+
+    config is applied on top of the defaults. With
+    GITEASY_DEFER_BACKGROUND set, background job workers are not started here
+    so a pre-forking server can build the app once in its master process and
+    start them in each worker (see gunicorn.conf.py).
+    """
+    # Imported here so that importing src.main stays cheap
+    from src.models import db
+    from src.models.database import configure_database, init_database
+    from src.routes.user import user_bp
+    from src.routes.git_routes import git_bp
+    from src.routes.auth_routes import auth_bp
+    from src.routes.job_routes import job_bp
+    from src.services import api_responses, metrics
+    from src.services.job_queue import job_queue
+    from src.services.repo_events import repo_events
+    from src.services.static_assets import StaticAssets
+
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+    app.config['GITEASY_DEFER_BACKGROUND'] = bool(os.environ.get('GITEASY_DEFER_BACKGROUND'))
+    if config:
+        app.config.update(config)
+
+    # Enable CORS for all routes
+    CORS(app)
+    # orjson encoding, content ETags and compression for API responses
+    api_responses.init_app(app)
+
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(git_bp, url_prefix='/api')
+    app.register_blueprint(auth_bp, url_prefix='/api')
+    app.register_blueprint(job_bp, url_prefix='/api')
+
+    # SQLite (WAL) by default; GITEASY_DATABASE_URL / DATABASE_URL for an external database
+    configure_database(app)
+    init_database(app)
+    # Route, SQL, git and GitHub timings; /metrics and X-GitEasy-Profile
+    metrics.init_app(app, db)
+    job_queue.init_app(app, start=not app.config['GITEASY_DEFER_BACKGROUND'])
+    repo_events.init_app(app)
+
+    # Manifest of the built frontend with precompressed variants
+    app.extensions['static_assets'] = StaticAssets(app.static_folder)
+    app.add_url_rule('/', defaults={'path': ''}, view_func=serve)
+    app.add_url_rule('/<path:path>', view_func=serve)
+    return app
+
+def init_worker(app):
+    """Per-process setup for a worker forked from a process that built app"""
+    from src.models.database import dispose_inherited_connections
+    from src.services.job_queue import job_queue
+
+    dispose_inherited_connections(app)
+    job_queue.start()
+
 def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
+    if current_app.static_folder is None:
             return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+    # Answered from the manifest built in create_app; no filesystem access
+    response = current_app.extensions['static_assets'].response(path, request)
+    if response is None:
+        return "index.html not found", 404
+    return response
 
+_app = None
 
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+def __getattr__(name):
+    # `from src.main import app` keeps working, but only builds the app on first use
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
+if __name__ == '__main__':
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
+
 
 
 # from flask import Flask, send_from_directory
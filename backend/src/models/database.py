@@ -0,0 +1,82 @@
+# src/models/database.py
+import os
+from sqlalchemy import event
+from src.models import db
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'app.db')
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+def configure_database(app):
+    """Set the database URL and engine options on app.config.
+
+    GITEASY_DATABASE_URL (or DATABASE_URL) selects an external database; the
+    bundled SQLite file is used otherwise, tuned for several concurrent
+    worker processes.
+    """
+    url = os.environ.get('GITEASY_DATABASE_URL') or os.environ.get('DATABASE_URL') or f"sqlite:///{DEFAULT_SQLITE_PATH}"
+    # SQLAlchemy dropped the postgres:// alias that some hosts still hand out
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+
+    options = {
+        'pool_size': _env_int('GITEASY_DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('GITEASY_DB_MAX_OVERFLOW', 10),
+        'pool_pre_ping': True
+    }
+
+    if url.startswith('sqlite'):
+        busy_timeout_ms = _env_int('GITEASY_SQLITE_BUSY_TIMEOUT_MS', 15000)
+        app.config['SQLITE_PRAGMAS'] = {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': busy_timeout_ms,
+            'mmap_size': _env_int('GITEASY_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+        }
+        options['connect_args'] = {
+            # The sqlite3 module's own wait, in effect before the pragmas run
+            'timeout': busy_timeout_ms / 1000.0,
+            # Pooled connections move between request and job threads
+            'check_same_thread': False
+        }
+    else:
+        options['pool_recycle'] = _env_int('GITEASY_DB_POOL_RECYCLE', 1800)
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+def init_database(app):
+    """Bind db to app, tune SQLite connections and create/upgrade the schema"""
+    from src.models.migrations import upgrade_schema
+
+    db.init_app(app)
+    with app.app_context():
+        pragmas = app.config.get('SQLITE_PRAGMAS')
+        if pragmas:
+            event.listen(db.engine, 'connect', _sqlite_pragma_listener(pragmas))
+        db.create_all()
+        upgrade_schema()
+
+def _sqlite_pragma_listener(pragmas):
+    # Runs on every new DBAPI connection: apart from journal_mode, which is
+    # stored in the database file, SQLite pragmas only last as long as the
+    # connection that set them
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return apply_pragmas
+
+def dispose_inherited_connections(app):
+    """Forget pooled connections a forked worker inherited from its parent.
+
+    Connections are left open for the parent (close=False); the worker opens
+    its own on first use. Sharing one SQLite handle across processes corrupts
+    its locking state.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
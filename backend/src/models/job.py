@@ -0,0 +1,41 @@
+from src.models import db
+from datetime import datetime
+import json
+
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # clone, push
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    repository_id = db.Column(db.Integer, db.ForeignKey('repository.id'), nullable=True)
+    params = db.Column(db.Text, nullable=False, default='{}')
+    worker = db.Column(db.String(100), nullable=True)
+    phase = db.Column(db.String(50), nullable=True)
+    objects_received = db.Column(db.Integer, nullable=True)
+    objects_total = db.Column(db.Integer, nullable=True)
+    bytes_received = db.Column(db.BigInteger, nullable=True)
+    progress = db.Column(db.Float, default=0.0)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'repository_id': self.repository_id,
+            'progress': {
+                'phase': self.phase,
+                'objects_received': self.objects_received,
+                'objects_total': self.objects_total,
+                'bytes_received': self.bytes_received,
+                'percent': self.progress
+            },
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,19 @@
+# src/models/migrations.py
+from sqlalchemy import inspect
+from src.models import db
+
+def upgrade_schema():
+    """Bring an existing database up to date with the models.
+
+    db.create_all() only creates missing tables, so indexes added to tables
+    that already exist in an app.db are created here.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=db.engine)
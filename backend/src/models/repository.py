@@ -25,10 +25,14 @@ class Repository(db.Model):
         }
 
 class FileChange(db.Model):
+    __table_args__ = (
+        db.Index('ix_file_change_repository_status', 'repository_id', 'status'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     repository_id = db.Column(db.Integer, db.ForeignKey('repository.id'), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
-    change_type = db.Column(db.String(20), nullable=False)  # added, modified, deleted
+    change_type = db.Column(db.String(20), nullable=False)  # added, modified, deleted, staged
     status = db.Column(db.String(20), default='pending')  # pending, committed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -45,6 +49,10 @@ class FileChange(db.Model):
         }
 
 class CommitHistory(db.Model):
+    __table_args__ = (
+        db.Index('ix_commit_history_repository_timestamp', 'repository_id', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     repository_id = db.Column(db.Integer, db.ForeignKey('repository.id'), nullable=False)
     commit_hash = db.Column(db.String(40), nullable=False)
@@ -1,9 +1,38 @@
-from flask import Blueprint, jsonify, request
-import requests
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 import base64
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
+from src.services import metrics
+from src.services.github_client import github_client, GitHubError, token_key
+from src.services.rate_limiter import INTERACTIVE, PRIORITIES
+from src.services.token_cache import token_cache
+from src.services.ttl_cache import TTLCache
+
+REPOSITORY_INFO_TTL = 30
+MAX_BATCH_REPOSITORIES = 50
 
 auth_bp = Blueprint('auth', __name__)
+# Assembled repository info per (token, repository); GitHub ETags keep refreshes cheap
+_repository_info_cache = TTLCache(REPOSITORY_INFO_TTL)
+_fan_out_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='github-fan-out')
+
+def _format_repository(repo):
+    """Fields of a GitHub repository object the frontend uses"""
+    return {
+        'id': repo['id'],
+        'name': repo['name'],
+        'full_name': repo['full_name'],
+        'description': repo['description'],
+        'clone_url': repo['clone_url'],
+        'ssh_url': repo['ssh_url'],
+        'html_url': repo['html_url'],
+        'private': repo['private'],
+        'default_branch': repo['default_branch'],
+        'updated_at': repo['updated_at'],
+        'language': repo['language']
+    }
 
 @auth_bp.route('/github/validate-token', methods=['POST'])
 def validate_github_token():
@@ -15,17 +44,16 @@ def validate_github_token():
         if not token:
             return jsonify({'error': 'Token is required'}), 400
         
-        # Test the token by making a request to GitHub API
-        headers = {
-            'Authorization': f'token {token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
+        cached = token_cache.get('validate', token)
+        if cached is not None:
+            return jsonify(cached)
         
-        response = requests.get('https://api.github.com/user', headers=headers)
+        # Test the token by making a request to GitHub API
+        response = github_client.get('/user', token)
         
         if response.status_code == 200:
             user_data = response.json()
-            return jsonify({
+            result = {
                 'valid': True,
                 'user': {
                     'login': user_data.get('login'),
@@ -34,7 +62,12 @@ def validate_github_token():
                     'avatar_url': user_data.get('avatar_url')
                 },
                 'scopes': response.headers.get('X-OAuth-Scopes', '').split(', ') if response.headers.get('X-OAuth-Scopes') else []
-            })
+            }
+            token_cache.set('validate', token, result)
+            return jsonify(result)
+        elif response.status_code == 429:
+            # Throttled, which says nothing about the token itself
+            return jsonify({'error': response.json().get('message'), 'message': 'GitHub rate limit reached'}), 429, {'Retry-After': response.headers.get('Retry-After', '60')}
         else:
             return jsonify({
                 'valid': False,
@@ -46,7 +79,12 @@ def validate_github_token():
 
 @auth_bp.route('/github/repositories', methods=['GET'])
 def get_user_repositories():
-    """Get user's GitHub repositories"""
+    """Get all of the user's GitHub repositories
+
+    Every page of /user/repos is fetched. Responds with NDJSON, one repository
+    per line as pages arrive, for ?format=ndjson or an Accept:
+    application/x-ndjson header.
+    """
     try:
         token = request.headers.get('Authorization')
         if not token:
@@ -56,46 +94,108 @@ def get_user_repositories():
         if token.startswith('Bearer '):
             token = token[7:]
         
-        headers = {
-            'Authorization': f'token {token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        
         # Get user's repositories
-        response = requests.get('https://api.github.com/user/repos', headers=headers, params={
+        pages = github_client.iter_pages('/user/repos', token, params={
             'sort': 'updated',
             'per_page': 100
         })
         
-        if response.status_code == 200:
-            repos = response.json()
-            formatted_repos = []
-            
-            for repo in repos:
-                formatted_repos.append({
-                    'id': repo['id'],
-                    'name': repo['name'],
-                    'full_name': repo['full_name'],
-                    'description': repo['description'],
-                    'clone_url': repo['clone_url'],
-                    'ssh_url': repo['ssh_url'],
-                    'html_url': repo['html_url'],
-                    'private': repo['private'],
-                    'default_branch': repo['default_branch'],
-                    'updated_at': repo['updated_at'],
-                    'language': repo['language']
-                })
-            
-            return jsonify({
-                'repositories': formatted_repos,
-                'total_count': len(formatted_repos)
-            })
-        else:
-            return jsonify({'error': 'Failed to fetch repositories'}), response.status_code
+        # Fetch the first page now so a bad token is still reported as such
+        try:
+            first_page = next(pages)
+        except GitHubError as e:
+            return jsonify({'error': 'Failed to fetch repositories'}), e.status_code
+        pages = itertools.chain([first_page], pages)
+        
+        if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+            def generate():
+                try:
+                    for page in pages:
+                        for repo in page:
+                            yield json.dumps(_format_repository(repo)) + '\n'
+                except Exception as e:
+                    # Headers are already sent; report the failure in-band
+                    yield json.dumps({'error': str(e), 'message': 'Failed to fetch repositories'}) + '\n'
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        try:
+            formatted_repos = [_format_repository(repo) for page in pages for repo in page]
+        except GitHubError as e:
+            return jsonify({'error': 'Failed to fetch repositories'}), e.status_code
+        
+        return jsonify({
+            'repositories': formatted_repos,
+            'total_count': len(formatted_repos)
+        })
             
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Failed to get repositories'}), 500
 
+def _fetch_branches(repo_full_name, token, priority=INTERACTIVE):
+    pages = github_client.iter_pages(f'/repos/{repo_full_name}/branches', token, params={'per_page': 100}, priority=priority)
+    return [{'name': branch['name'], 'protected': branch.get('protected', False)} for page in pages for branch in page]
+
+def _start_repository_info(repo_full_name, token, priority=INTERACTIVE):
+    """Begin fetching metadata and branches for a repository in parallel"""
+    return (
+        _fan_out_pool.submit(metrics.propagate(github_client.get), f'/repos/{repo_full_name}', token, priority=priority),
+        _fan_out_pool.submit(metrics.propagate(_fetch_branches), repo_full_name, token, priority)
+    )
+
+def _finish_repository_info(repo_full_name, token, futures):
+    """(status code, payload) for a repository once its fetches complete"""
+    cache_key = (token_key(token), repo_full_name.lower())
+    metadata_future, branches_future = futures
+    response = metadata_future.result()
+    if response.status_code != 200:
+        branches_future.cancel()
+        return response.status_code, {'error': 'Repository not found or access denied'}
+    
+    repo = response.json()
+    try:
+        branches = branches_future.result()
+        complete = True
+    except GitHubError:
+        branches = []
+        complete = False
+    
+    info = {
+        'repository': {
+            'id': repo['id'],
+            'name': repo['name'],
+            'full_name': repo['full_name'],
+            'description': repo['description'],
+            'clone_url': repo['clone_url'],
+            'ssh_url': repo['ssh_url'],
+            'html_url': repo['html_url'],
+            'private': repo['private'],
+            'default_branch': repo['default_branch'],
+            'updated_at': repo['updated_at'],
+            'language': repo['language'],
+            'size': repo['size'],
+            'stargazers_count': repo['stargazers_count'],
+            'forks_count': repo['forks_count']
+        },
+        'branches': branches
+    }
+    if complete:
+        _repository_info_cache.set(cache_key, info)
+    return 200, info
+
+def _get_repository_infos(repo_full_names, token, priority=INTERACTIVE):
+    """{name: (status code, payload)}, fetching every uncached repository at once"""
+    results = {}
+    pending = {}
+    for name in repo_full_names:
+        cached = _repository_info_cache.get((token_key(token), name.lower()))
+        if cached is not None:
+            results[name] = (200, cached)
+        elif name not in pending:
+            pending[name] = _start_repository_info(name, token, priority)
+    for name, futures in pending.items():
+        results[name] = _finish_repository_info(name, token, futures)
+    return results
+
 @auth_bp.route('/github/repository/<path:repo_full_name>', methods=['GET'])
 def get_repository_info(repo_full_name):
     """Get detailed information about a specific repository"""
@@ -108,42 +208,47 @@ def get_repository_info(repo_full_name):
         if token.startswith('Bearer '):
             token = token[7:]
         
-        headers = {
-            'Authorization': f'token {token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
+        status_code, info = _get_repository_infos([repo_full_name], token)[repo_full_name]
+        if status_code != 200:
+            return jsonify(info), status_code
+        return jsonify(info)
+            
+    except Exception as e:
+        return jsonify({'error': str(e), 'message': 'Failed to get repository information'}), 500
+
+@auth_bp.route('/github/repositories/info', methods=['GET'])
+def get_repositories_info():
+    """Get detailed information for several repositories (?repository=owner/name, repeated)
+
+    ?priority=background marks a prefetch, which yields GitHub rate limit
+    budget to interactive requests.
+    """
+    try:
+        token = request.headers.get('Authorization')
+        if not token:
+            return jsonify({'error': 'Authorization token required'}), 401
         
-        # Get repository information
-        response = requests.get(f'https://api.github.com/repos/{repo_full_name}', headers=headers)
+        # Remove 'Bearer ' prefix if present
+        if token.startswith('Bearer '):
+            token = token[7:]
         
-        if response.status_code == 200:
-            repo = response.json()
-            
-            # Get branches
-            branches_response = requests.get(f'https://api.github.com/repos/{repo_full_name}/branches', headers=headers)
-            branches = branches_response.json() if branches_response.status_code == 200 else []
-            
-            return jsonify({
-                'repository': {
-                    'id': repo['id'],
-                    'name': repo['name'],
-                    'full_name': repo['full_name'],
-                    'description': repo['description'],
-                    'clone_url': repo['clone_url'],
-                    'ssh_url': repo['ssh_url'],
-                    'html_url': repo['html_url'],
-                    'private': repo['private'],
-                    'default_branch': repo['default_branch'],
-                    'updated_at': repo['updated_at'],
-                    'language': repo['language'],
-                    'size': repo['size'],
-                    'stargazers_count': repo['stargazers_count'],
-                    'forks_count': repo['forks_count']
-                },
-                'branches': [{'name': branch['name'], 'protected': branch.get('protected', False)} for branch in branches]
-            })
-        else:
-            return jsonify({'error': 'Repository not found or access denied'}), response.status_code
+        repo_full_names = request.args.getlist('repository')
+        if not repo_full_names:
+            return jsonify({'error': 'At least one repository is required'}), 400
+        if len(repo_full_names) > MAX_BATCH_REPOSITORIES:
+            return jsonify({'error': f'At most {MAX_BATCH_REPOSITORIES} repositories per request'}), 400
+        
+        priority = PRIORITIES.get(request.args.get('priority', 'interactive'))
+        if priority is None:
+            return jsonify({'error': f"priority must be one of: {', '.join(PRIORITIES)}"}), 400
+        
+        results = _get_repository_infos(repo_full_names, token, priority)
+        repositories = []
+        for name in dict.fromkeys(repo_full_names):
+            status_code, info = results[name]
+            repositories.append(dict(info, full_name=name, status_code=status_code))
+        
+        return jsonify({'repositories': repositories})
             
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Failed to get repository information'}), 500
@@ -159,19 +264,18 @@ def check_repository_permissions():
         if not token or not repo_full_name:
             return jsonify({'error': 'Token and repository name are required'}), 400
         
-        headers = {
-            'Authorization': f'token {token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
+        cached = token_cache.get('permissions', token, subject=repo_full_name.lower())
+        if cached is not None:
+            return jsonify(cached)
         
         # Check repository permissions
-        response = requests.get(f'https://api.github.com/repos/{repo_full_name}', headers=headers)
+        response = github_client.get(f'/repos/{repo_full_name}', token)
         
         if response.status_code == 200:
             repo_data = response.json()
             permissions = repo_data.get('permissions', {})
             
-            return jsonify({
+            result = {
                 'has_access': True,
                 'permissions': {
                     'admin': permissions.get('admin', False),
@@ -179,7 +283,9 @@ def check_repository_permissions():
                     'pull': permissions.get('pull', False)
                 },
                 'can_push': permissions.get('push', False) or permissions.get('admin', False)
-            })
+            }
+            token_cache.set('permissions', token, result, subject=repo_full_name.lower())
+            return jsonify(result)
         else:
             return jsonify({
                 'has_access': False,
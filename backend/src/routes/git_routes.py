@@ -1,17 +1,64 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request
 from src.models.repository import Repository, FileChange, CommitHistory, db
-from src.services.git_service import GitManager
+from src.services.github_client import github_client
+from src.services.job_queue import job_queue, JobError, JobQueueFull
+from src.services.repo_events import repo_events, TooManySubscribers
 from datetime import datetime
+import hashlib
+import itertools
+import json
+import threading
+from sqlalchemy import and_, bindparam, delete, insert, or_, select, update
+from src.services import metrics
+from src.services.api_responses import not_modified
+from src.services.pagination import cursor_id, cursor_timestamp, page_args, page_limit, split_page
 import os
+from werkzeug.local import LocalProxy
+
+SQL_IN_BATCH_SIZE = 500
 
 git_bp = Blueprint('git', __name__)
-git_manager = GitManager()
+_git_manager = None
+_git_manager_lock = threading.Lock()
+
+def _get_git_manager():
+    """The process's GitManager, created (and GitPython imported) on first use"""
+    global _git_manager
+    if _git_manager is None:
+        with _git_manager_lock:
+            if _git_manager is None:
+                from src.services.git_service import GitManager
+                _git_manager = GitManager()
+    return _git_manager
+
+git_manager = LocalProxy(_get_git_manager)
+
+def _wants_async(data):
+    """Whether the caller asked for the operation to run as a background job"""
+    value = data.get('async', request.args.get('async', False))
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
 
 @git_bp.route('/repositories', methods=['GET'])
 def get_repositories():
-    """Get all repositories"""
-    repositories = Repository.query.all()
-    return jsonify([repo.to_dict() for repo in repositories])
+    """Get repositories, one keyset page at a time (?limit=&after=)"""
+    try:
+        limit, after = page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = Repository.query.order_by(Repository.id)
+    if after:
+        query = query.filter(Repository.id > after[0])
+    repositories, next_cursor = split_page(query.limit(limit + 1).all(), limit, lambda repo: [repo.id])
+    
+    # The body stays a plain list for existing clients; the cursor travels in headers
+    response = jsonify([repo.to_dict() for repo in repositories])
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?limit={limit}&after={next_cursor}>; rel="next"'
+    return response
 
 @git_bp.route('/repositories', methods=['POST'])
 def create_repository():
@@ -21,37 +68,70 @@ def create_repository():
         github_url = data.get('github_url')
         repo_name = data.get('name')
         github_token = data.get('github_token')
+        clone_options = data.get('clone_options')  # depth, filter, sparse, single_branch, branch, use_object_cache
         
         if not github_url or not repo_name:
             return jsonify({'error': 'GitHub URL and repository name are required'}), 400
         
+        if _wants_async(data):
+            job = job_queue.submit(
+                'clone',
+                {'github_url': github_url, 'name': repo_name, 'clone_options': clone_options},
+                secrets={'github_token': github_token} if github_token else None
+            )
+            return jsonify({
+                'message': 'Repository clone started',
+                'job': job.to_dict()
+            }), 202
+        
         # Clone the repository
-        result = git_manager.clone_repository(github_url, repo_name, github_token)
+        result = git_manager.clone_repository(github_url, repo_name, github_token, clone_options=clone_options)
         
         if not result['success']:
             return jsonify({'error': result['error'], 'message': result['message']}), 400
         
-        # Save repository to database
-        repository = Repository(
-            name=repo_name,
-            github_url=github_url,
-            local_path=result['local_path'],
-            branch=result['branch'],
-            status='active',
-            last_sync=datetime.utcnow()
-        )
-        
-        db.session.add(repository)
-        db.session.commit()
+        repository = _save_cloned_repository(github_url, repo_name, result)
         
         return jsonify({
             'message': 'Repository cloned successfully',
             'repository': repository.to_dict()
         }), 201
         
+    except JobQueueFull as e:
+        return jsonify({'error': str(e), 'message': 'Failed to create repository'}), 503
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Failed to create repository'}), 500
 
+def _save_cloned_repository(github_url, repo_name, result):
+    """Record a freshly cloned repository in the database"""
+    repository = Repository(
+        name=repo_name,
+        github_url=github_url,
+        local_path=result['local_path'],
+        branch=result['branch'],
+        status='active',
+        last_sync=datetime.utcnow()
+    )
+    
+    db.session.add(repository)
+    db.session.commit()
+    return repository
+
+def _run_clone_job(params, secrets, progress):
+    """Job handler: clone a repository and record it"""
+    result = git_manager.clone_repository(
+        params['github_url'],
+        params['name'],
+        secrets.get('github_token'),
+        progress=progress,
+        clone_options=params.get('clone_options')
+    )
+    if not result['success']:
+        raise JobError(result['error'])
+    
+    repository = _save_cloned_repository(params['github_url'], params['name'], result)
+    return {'repository': repository.to_dict()}
+
 @git_bp.route('/repositories/<int:repo_id>', methods=['GET'])
 def get_repository(repo_id):
     """Get a specific repository"""
@@ -63,20 +143,30 @@ def get_repository_status(repo_id):
     """Get the current Git status of a repository"""
     try:
         repository = Repository.query.get_or_404(repo_id)
+        repository_tag = hashlib.sha1(json.dumps(repository.to_dict(), sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        
+        # Unchanged since this client's last poll: skip git and the body entirely
+        status_etag = git_manager.status_etag(repository.local_path)
+        if status_etag and request.if_none_match.contains_weak(f'{status_etag}.{repository_tag}'):
+            return not_modified(f'{status_etag}.{repository_tag}')
         
         # Get Git status
         status_result = git_manager.get_repository_status(repository.local_path)
         
         if not status_result['success']:
             return jsonify({'error': status_result['error'], 'message': status_result['message']}), 400
+        status_etag = status_result.pop('etag', None)
         
         # Update pending changes in database
         _update_pending_changes(repository.id, status_result)
         
-        return jsonify({
+        response = jsonify({
             'repository': repository.to_dict(),
             'git_status': status_result
         })
+        if status_etag:
+            response.set_etag(f'{status_etag}.{repository_tag}', weak=True)
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Failed to get repository status'}), 500
@@ -104,7 +194,11 @@ def upload_files(repo_id):
         
         return jsonify({
             'message': 'Files uploaded successfully',
-            'uploaded_files': result['saved_files']
+            'uploaded_files': result['saved_files'] + result['unchanged_files'],
+            'written_files': result['saved_files'],
+            'unchanged_files': result['unchanged_files'],
+            'written_count': result['written_count'],
+            'unchanged_count': result['unchanged_count']
         })
         
     except Exception as e:
@@ -122,11 +216,16 @@ def add_files(repo_id):
         result = git_manager.add_files(repository.local_path, file_paths)
         
         if not result['success']:
-            return jsonify({'error': result['error'], 'message': result['message']}), 400
+            return jsonify({
+                'error': result['error'],
+                'message': result['message'],
+                'failed_files': result.get('failed_files', [])
+            }), 400
         
         return jsonify({
             'message': 'Files added to staging area',
-            'added_files': result['added_files']
+            'added_files': result['added_files'],
+            'failed_files': result.get('failed_files', [])
         })
         
     except Exception as e:
@@ -153,28 +252,68 @@ def commit_changes(repo_id):
         if not result['success']:
             return jsonify({'error': result['error'], 'message': result['message']}), 400
         
-        # Save commit to database
-        commit_history = CommitHistory(
-            repository_id=repository.id,
-            commit_hash=result['commit_hash'],
-            message=message,
-            author=result['author'],
-            timestamp=datetime.fromisoformat(result['timestamp'])
+        _record_commit(repository, result)
+        
+        return jsonify({
+            'message': 'Changes committed successfully',
+            'commit': result
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e), 'message': 'Failed to commit changes'}), 500
+
+@git_bp.route('/repositories/<int:repo_id>/commit-files', methods=['POST'])
+def commit_uploaded_files(repo_id):
+    """Upload files and commit them in one step, without staging"""
+    try:
+        repository = Repository.query.get_or_404(repo_id)
+        
+        if 'files' not in request.files:
+            return jsonify({'error': 'No files provided'}), 400
+        
+        files = request.files.getlist('files')
+        message = request.form.get('message', 'Update files via GitEasy')
+        author_name = request.form.get('author_name', 'GitEasy User')
+        author_email = request.form.get('author_email', 'user@giteasy.com')
+        update_worktree = request.form.get('update_worktree', 'true').lower() in ('1', 'true', 'yes')
+        
+        result = git_manager.commit_uploaded_files(
+            repository.local_path,
+            files,
+            message,
+            author_name,
+            author_email,
+            update_worktree
         )
         
-        db.session.add(commit_history)
+        if not result['success']:
+            return jsonify({'error': result['error'], 'message': result['message']}), 400
         
-        # Update repository status
-        repository.last_sync = datetime.utcnow()
-        db.session.commit()
+        _record_commit(repository, result)
         
         return jsonify({
-            'message': 'Changes committed successfully',
+            'message': 'Files committed successfully',
             'commit': result
         })
         
     except Exception as e:
-        return jsonify({'error': str(e), 'message': 'Failed to commit changes'}), 500
+        return jsonify({'error': str(e), 'message': 'Failed to commit files'}), 500
+
+def _record_commit(repository, result):
+    """Save a commit made through GitEasy to the history table"""
+    commit_history = CommitHistory(
+        repository_id=repository.id,
+        commit_hash=result['commit_hash'],
+        message=result['message'],
+        author=result['author'],
+        timestamp=datetime.fromisoformat(result['timestamp'])
+    )
+    
+    db.session.add(commit_history)
+    
+    # Update repository status
+    repository.last_sync = datetime.utcnow()
+    db.session.commit()
 
 @git_bp.route('/repositories/<int:repo_id>/push', methods=['POST'])
 def push_changes(repo_id):
@@ -185,11 +324,23 @@ def push_changes(repo_id):
         github_token = data.get('github_token')
         branch = data.get('branch', repository.branch)
         
+        if _wants_async(data):
+            job = job_queue.submit(
+                'push',
+                {'repository_id': repository.id, 'branch': branch},
+                secrets={'github_token': github_token} if github_token else None,
+                repository_id=repository.id
+            )
+            return jsonify({
+                'message': 'Push started',
+                'job': job.to_dict()
+            }), 202
+        
         # Push changes
         result = git_manager.push_changes(repository.local_path, github_token, branch)
         
         if not result['success']:
-            return jsonify({'error': result['error'], 'message': result['message']}), 400
+            return jsonify({'error': result['error'], 'message': result['message']}), 401 if result.get('auth_failed') else 400
         
         # Update repository status
         repository.last_sync = datetime.utcnow()
@@ -200,68 +351,342 @@ def push_changes(repo_id):
             'push_result': result
         })
         
+    except JobQueueFull as e:
+        return jsonify({'error': str(e), 'message': 'Failed to push changes'}), 503
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Failed to push changes'}), 500
 
+def _run_push_job(params, secrets, progress):
+    """Job handler: push a repository branch to GitHub"""
+    repository = db.session.get(Repository, params['repository_id'])
+    if repository is None:
+        raise JobError('Repository no longer exists')
+    
+    result = git_manager.push_changes(
+        repository.local_path,
+        secrets.get('github_token'),
+        params['branch'],
+        progress=progress
+    )
+    if not result['success']:
+        raise JobError(result['error'])
+    
+    repository.last_sync = datetime.utcnow()
+    db.session.commit()
+    return {'push_result': result}
+
+job_queue.register('clone', _run_clone_job)
+job_queue.register('push', _run_push_job)
+
+@git_bp.route('/repositories/<int:repo_id>/sync', methods=['POST'])
+def sync_repository(repo_id):
+    """Fetch and fast-forward (or reset) an existing checkout"""
+    try:
+        repository = Repository.query.get_or_404(repo_id)
+        data = request.json or {}
+        github_token = data.get('github_token')
+        branch = data.get('branch', repository.branch)
+        mode = data.get('mode', 'fast-forward')  # fast-forward, reset
+        
+        if _wants_async(data):
+            job = job_queue.submit(
+                'sync',
+                {'repository_id': repository.id, 'branch': branch, 'mode': mode},
+                secrets={'github_token': github_token} if github_token else None,
+                repository_id=repository.id
+            )
+            return jsonify({
+                'message': 'Sync started',
+                'job': job.to_dict()
+            }), 202
+        
+        result = git_manager.sync_repository(
+            repository.local_path,
+            github_token,
+            branch,
+            mode,
+            github_url=repository.github_url
+        )
+        
+        if not result['success']:
+            return jsonify({'error': result['error'], 'message': result['message']}), 400
+        
+        _record_sync(repository, result)
+        
+        return jsonify({
+            'message': 'Repository synced successfully',
+            'sync_result': result,
+            'repository': repository.to_dict()
+        })
+        
+    except JobQueueFull as e:
+        return jsonify({'error': str(e), 'message': 'Failed to sync repository'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e), 'message': 'Failed to sync repository'}), 500
+
+def _record_sync(repository, result):
+    """Store the outcome of a successful sync on the repository row"""
+    repository.branch = result['branch']
+    repository.last_sync = datetime.utcnow()
+    db.session.commit()
+
+def _run_sync_job(params, secrets, progress):
+    """Job handler: sync an existing checkout with its remote"""
+    repository = db.session.get(Repository, params['repository_id'])
+    if repository is None:
+        raise JobError('Repository no longer exists')
+    
+    result = git_manager.sync_repository(
+        repository.local_path,
+        secrets.get('github_token'),
+        params['branch'],
+        params['mode'],
+        progress=progress,
+        github_url=repository.github_url
+    )
+    if not result['success']:
+        raise JobError(result['error'])
+    
+    _record_sync(repository, result)
+    return {'sync_result': result, 'repository': repository.to_dict()}
+
+job_queue.register('sync', _run_sync_job)
+
 @git_bp.route('/repositories/<int:repo_id>/history', methods=['GET'])
 def get_commit_history(repo_id):
-    """Get commit history for a repository"""
+    """Get commit history for a repository, newest first, paginated by cursor"""
     try:
         repository = Repository.query.get_or_404(repo_id)
-        commits = CommitHistory.query.filter_by(repository_id=repo_id).order_by(CommitHistory.timestamp.desc()).all()
+        try:
+            limit, after = page_args(request.args, key=(cursor_timestamp, cursor_id))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = CommitHistory.query.filter_by(repository_id=repo_id).order_by(
+            CommitHistory.timestamp.desc(), CommitHistory.id.desc()
+        )
+        if after:
+            after_timestamp, after_id = after
+            query = query.filter(or_(
+                CommitHistory.timestamp < after_timestamp,
+                and_(CommitHistory.timestamp == after_timestamp, CommitHistory.id < after_id)
+            ))
+        commits, next_cursor = split_page(
+            query.limit(limit + 1).all(),
+            limit,
+            lambda commit: [commit.timestamp.isoformat(), commit.id]
+        )
         
         return jsonify({
             'repository': repository.to_dict(),
-            'commits': [commit.to_dict() for commit in commits]
+            'commits': [commit.to_dict() for commit in commits],
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Failed to get commit history'}), 500
 
+@git_bp.route('/repositories/<int:repo_id>/log', methods=['GET'])
+def get_git_log(repo_id):
+    """Get the repository's git log (?ref=&path=&author=&limit=&after=&count=)
+
+    Responds with NDJSON, one commit per line, for ?format=ndjson or an
+    Accept: application/x-ndjson header; limit is then optional.
+    """
+    try:
+        repository = Repository.query.get_or_404(repo_id)
+        ref = request.args.get('ref', 'HEAD')
+        paths = request.args.getlist('path') or None
+        author = request.args.get('author')
+        after = request.args.get('after')
+        
+        if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+            limit = request.args.get('limit', type=int)
+            from git import GitCommandError
+            commits = git_manager.stream_commit_log(repository.local_path, ref, paths, author, after, limit)
+            # Pull the first commit now so a bad ref or cursor is still a 400, not a broken stream
+            try:
+                first = next(commits, None)
+            except (ValueError, GitCommandError) as e:
+                return jsonify({'error': str(e), 'message': 'Failed to read commit log'}), 400
+            if first is not None:
+                commits = itertools.chain([first], commits)
+            return Response(
+                (json.dumps(commit) + '\n' for commit in commits),
+                mimetype='application/x-ndjson'
+            )
+        
+        try:
+            limit = page_limit(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        result = git_manager.get_commit_log(
+            repository.local_path,
+            ref,
+            paths,
+            author,
+            after,
+            limit,
+            with_count=request.args.get('count', '').lower() in ('1', 'true', 'yes')
+        )
+        
+        if not result['success']:
+            return jsonify({'error': result['error'], 'message': result['message']}), 400
+        
+        return jsonify({
+            'repository': repository.to_dict(),
+            'commits': result['commits'],
+            'next_cursor': result['next_cursor'],
+            'total_count': result['total_count']
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e), 'message': 'Failed to get git log'}), 500
+
 @git_bp.route('/repositories/<int:repo_id>/changes', methods=['GET'])
 def get_pending_changes(repo_id):
-    """Get pending file changes for a repository"""
+    """Get pending file changes for a repository, paginated by cursor"""
     try:
         repository = Repository.query.get_or_404(repo_id)
-        changes = FileChange.query.filter_by(repository_id=repo_id, status='pending').all()
+        try:
+            limit, after = page_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = FileChange.query.filter_by(repository_id=repo_id, status='pending').order_by(FileChange.id)
+        if after:
+            query = query.filter(FileChange.id > after[0])
+        changes, next_cursor = split_page(query.limit(limit + 1).all(), limit, lambda change: [change.id])
         
         return jsonify({
             'repository': repository.to_dict(),
-            'pending_changes': [change.to_dict() for change in changes]
+            'pending_changes': [change.to_dict() for change in changes],
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
         return jsonify({'error': str(e), 'message': 'Failed to get pending changes'}), 500
 
+@git_bp.route('/repositories/<int:repo_id>/events', methods=['GET'])
+def stream_repository_events(repo_id):
+    """Server-Sent Events: status, status-delta and job events for a repository"""
+    repository = Repository.query.get_or_404(repo_id)
+    try:
+        subscription = repo_events.subscribe(repository.id, repository.local_path)
+    except TooManySubscribers as e:
+        # Each stream holds a worker thread; past the cap, clients poll instead
+        response = jsonify({'error': str(e), 'message': 'Too many open event streams; poll the status endpoint instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    def generate():
+        try:
+            # Reconnect quickly if the connection drops
+            yield 'retry: 3000\n\n'
+            yield from subscription.stream()
+        finally:
+            repo_events.unsubscribe(subscription)
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Stop nginx from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
+    # Frees the slot even if the client left before the generator started
+    response.call_on_close(lambda: repo_events.unsubscribe(subscription))
+    return response
+
+def _status_for_events(repository_id, local_path, last_etag):
+    """Status for the event stream, or None if unchanged since last_etag"""
+    if last_etag is not None and git_manager.status_etag(local_path) == last_etag:
+        return None
+    result = git_manager.get_repository_status(local_path)
+    if result['success']:
+        if result['etag'] is not None and result['etag'] == last_etag:
+            return None
+        _update_pending_changes(repository_id, result)
+    return result
+
+repo_events.register_status_source(_status_for_events)
+
+@git_bp.route('/internal/stats', methods=['GET'])
+def get_internal_stats():
+    """Get internal cache and pool counters (behind GITEASY_METRICS_TOKEN, like /metrics)"""
+    metrics.require_metrics_token()
+    return jsonify({
+        'repo_pool': git_manager.repo_pool.stats(),
+        'status_cache': git_manager.status_cache.stats(),
+        'github_rate_limits': github_client.scheduler.stats(),
+        'repo_events': repo_events.stats()
+    })
+
 def _update_pending_changes(repo_id, git_status):
-    """Update pending changes in database based on Git status"""
+    """Reconcile pending FileChange rows with Git status using set differences"""
     try:
-        # Clear existing pending changes
-        FileChange.query.filter_by(repository_id=repo_id, status='pending').delete()
-        
-        # Add modified files
+        # Desired state; a file both staged and modified needs another add, so
+        # 'modified' wins, and untracked files are new
+        desired = {}
+        for file_path in git_status.get('staged_files', []):
+            desired[file_path] = 'staged'
         for file_path in git_status.get('modified_files', []):
-            change = FileChange(
-                repository_id=repo_id,
-                file_path=file_path,
-                change_type='modified',
-                status='pending'
-            )
-            db.session.add(change)
-        
-        # Add untracked files
+            desired[file_path] = 'modified'
         for file_path in git_status.get('untracked_files', []):
-            change = FileChange(
-                repository_id=repo_id,
-                file_path=file_path,
-                change_type='added',
-                status='pending'
+            desired[file_path] = 'added'
+        
+        table = FileChange.__table__
+        pending = (table.c.repository_id == repo_id) & (table.c.status == 'pending')
+        existing = {}
+        row_ids = {}
+        for row_id, file_path, change_type in db.session.execute(
+            select(table.c.id, table.c.file_path, table.c.change_type).where(pending)
+        ):
+            existing[file_path] = change_type
+            row_ids.setdefault(file_path, []).append(row_id)
+        
+        new_paths = desired.keys() - existing.keys()
+        vanished_paths = existing.keys() - desired.keys()
+        changed_paths = [path for path in desired.keys() & existing.keys() if desired[path] != existing[path]]
+        
+        if not (new_paths or vanished_paths or changed_paths):
+            return
+        
+        if new_paths:
+            now = datetime.utcnow()
+            db.session.execute(insert(table), [
+                {
+                    'repository_id': repo_id,
+                    'file_path': path,
+                    'change_type': desired[path],
+                    'status': 'pending',
+                    'created_at': now
+                }
+                for path in new_paths
+            ])
+        
+        # Deletes and updates go by primary key: file_path isn't indexed, so
+        # matching on it would scan the repository's pending rows per path
+        vanished_ids = [row_id for path in vanished_paths for row_id in row_ids[path]]
+        # Chunked to stay under SQLite's bound-parameter limit
+        for start in range(0, len(vanished_ids), SQL_IN_BATCH_SIZE):
+            batch = vanished_ids[start:start + SQL_IN_BATCH_SIZE]
+            db.session.execute(delete(table).where(table.c.id.in_(batch)))
+        
+        if changed_paths:
+            db.session.execute(
+                update(table)
+                .where(table.c.id == bindparam('b_id'))
+                .values(change_type=bindparam('b_change_type')),
+                [
+                    {'b_id': row_id, 'b_change_type': desired[path]}
+                    for path in changed_paths for row_id in row_ids[path]
+                ]
             )
-            db.session.add(change)
         
         db.session.commit()
         
-    except Exception as e:
-        print(f"Error updating pending changes: {e}")
+    except Exception:
+        current_app.logger.exception('Error updating pending changes for repository %s', repo_id)
+        metrics.errors_total.inc(where='update_pending_changes')
         db.session.rollback()
-
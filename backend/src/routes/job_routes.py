@@ -0,0 +1,10 @@
+from flask import Blueprint, jsonify
+from src.models.job import Job, db
+
+job_bp = Blueprint('jobs', __name__)
+
+@job_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the state and progress of a background job"""
+    job = db.get_or_404(Job, job_id)
+    return jsonify(job.to_dict())
@@ -0,0 +1,117 @@
+"""JSON encoding, ETags and compression for API responses.
+
+``OrjsonProvider`` swaps Flask's JSON encoder for orjson when it is installed
+(same output shape: sorted keys, HTTP dates). ``init_app`` adds an
+``after_request`` hook for blueprint routes that
+
+* gives buffered JSON responses without an ETag a weak content ETag and
+  answers a matching If-None-Match with 304 (routes with a cheaper
+  validator, like repository status, set their own ETag and 304 before
+  building the body);
+* compresses bodies above a size threshold with brotli (if installed) or
+  gzip, according to Accept-Encoding.
+
+Streamed responses (NDJSON) are left alone.
+"""
+import gzip
+import hashlib
+import os
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # stdlib json
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+MIN_COMPRESS_SIZE = int(os.environ.get('GITEASY_COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    options = 0 if orjson is None else (
+        orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    )
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # indent, cls and friends: let the stdlib handle the unusual cases
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.options).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            # Pretty-printed in debug mode, as with the default provider
+            return super().response(obj)
+        body = orjson.dumps(obj, default=self.default, option=self.options | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Use the fast JSON provider and post-process blueprint responses"""
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    app.after_request(_finish_api_response)
+
+
+def _finish_api_response(response):
+    # The frontend's catch-all route has its own caching and compression
+    if request.blueprint is None or response.direct_passthrough or response.is_streamed:
+        return response
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+
+    if request.method in ('GET', 'HEAD') and response.mimetype == 'application/json' and not response.get_etag()[0]:
+        response.set_etag(hashlib.sha1(response.get_data()).hexdigest(), weak=True)
+        tag, _ = response.get_etag()
+        if request.if_none_match.contains_weak(tag):
+            return not_modified(tag)
+
+    return compress(response)
+
+
+def not_modified(etag):
+    """Empty 304 for the weak ETag etag"""
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress(response):
+    """Compress response's body in place if the client accepts it and it's worth it"""
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+        encoding = 'br'
+    elif accept['gzip']:
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        encoding = 'gzip'
+    else:
+        return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -1,40 +1,171 @@
+import base64
+import functools
 import os
 import shutil
-from git import Repo, GitCommandError
-from git.exc import InvalidGitRepositoryError
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from git import GitCommandError, Actor, Commit, Tree
+from git.exc import BadName, InvalidGitRepositoryError, NoSuchPathError
 from datetime import datetime
 import requests
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urlunparse
+from src.services import metrics
+from src.services.history import iter_log, iter_log_with_positions, log_cursor, count_commits, has_commit_graph, write_commit_graph
+from src.services.instrumented_git import InstrumentedRepo
+from src.services.object_cache import ObjectCache, normalize_url
+from src.services.repo_locks import RepoLocks, RepoBusy, SingleFlight, READ, WRITE
+from src.services.repo_pool import RepoPool
+from src.services.staging import stage_paths
+from src.services.status_cache import StatusCache
+from src.services.token_cache import token_cache, is_auth_error
+from src.services.tree_builder import build_tree, store_blob
+from src.services.uploads import safe_relative_path, seekable_upload, hash_upload, write_upload, index_blobs, worktree_changed
+
+AHEAD_BEHIND_CACHE_SIZE = 1024
+CLONE_FILTERS = ('blob:none', 'tree:0')
+SYNC_MODES = ('fast-forward', 'reset')
+UPLOAD_WORKERS = 8
+
+def _git_config(repo, key, all_values=False):
+    """Value of config key in repo (a list with all_values), None / [] if unset"""
+    try:
+        if all_values:
+            return repo.git.config('--get-all', key).splitlines()
+        return repo.git.config('--get', key)
+    except GitCommandError:
+        return [] if all_values else None
+
+def _without_credentials(url):
+    """HTTP(S) url with any user:password@ removed from its host part"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or '@' not in parsed.netloc:
+        return url
+    return urlunparse(parsed._replace(netloc=parsed.netloc.rpartition('@')[2]))
+
+def _locked(mode, path_of=None):
+    """Run a GitManager method under the checkout's read or write lock.
+
+    The checkout is the method's first argument unless path_of(self, *args)
+    derives it. A lock that can't be taken in time is reported like any
+    other failure.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            local_path = path_of(self, *args) if path_of else args[0]
+            try:
+                with self.repo_locks.hold(local_path, mode):
+                    return method(self, *args, **kwargs)
+            except RepoBusy as e:
+                return _busy_result(e)
+        return wrapper
+    return decorator
+
+def _busy_result(error):
+    return {
+        'success': False,
+        'error': str(error),
+        'message': 'Another operation on this repository is still running'
+    }
 
 class GitManager:
-    def __init__(self, base_repos_dir="/tmp/giteasy_repos"):
+    def __init__(self, base_repos_dir="/tmp/giteasy_repos", repo_pool=None):
         self.base_repos_dir = base_repos_dir
+        self.repo_pool = repo_pool or RepoPool()
+        self.status_cache = StatusCache(base_repos_dir)
+        self.object_cache = ObjectCache(os.path.join(base_repos_dir, '.object-cache'))
+        self._ahead_behind_cache = OrderedDict()
+        self._ahead_behind_lock = threading.Lock()
+        self._commit_graph_pending = set()
+        self._commit_graph_lock = threading.Lock()
+        # Outside the checkouts so a lock survives a re-clone
+        self.repo_locks = RepoLocks(os.path.join(base_repos_dir, '.locks'))
+        self._single_flight = SingleFlight()
         os.makedirs(base_repos_dir, exist_ok=True)
     
-    def clone_repository(self, github_url, repo_name, github_token=None):
-        """Clone a GitHub repository to local storage"""
+    @metrics.timed_operation('clone')
+    def clone_repository(self, github_url, repo_name, github_token=None, progress=None, clone_options=None):
+        """Clone a GitHub repository to local storage.
+
+        clone_options may contain ``depth``, ``filter`` (``blob:none`` or
+        ``tree:0``), ``sparse`` (list of cone-mode directories),
+        ``single_branch``, ``branch`` and ``use_object_cache``.
+
+        The transfer goes into a staging directory next to the checkout; the
+        checkout's write lock is only held to swap it into place, so status
+        reads of a checkout being replaced aren't held up by the network.
+        """
         try:
+            clone_options = clone_options or {}
+            clone_kwargs = self._clone_kwargs(clone_options)
             local_path = os.path.join(self.base_repos_dir, repo_name)
             
-            # Remove existing directory if it exists
-            if os.path.exists(local_path):
-                shutil.rmtree(local_path)
+            # Refresh an existing checkout of the same upstream, made with the
+            # same options, in place rather than transferring everything again
+            if (os.path.exists(local_path) and self._is_checkout_of(local_path, github_url)
+                    and self._checkout_matches(local_path, clone_options)):
+                branch = clone_options.get('branch') or self._remote_default_branch(local_path)
+                result = self.sync_repository(local_path, github_token, branch=branch, mode='reset', progress=progress)
+                if result['success']:
+                    return {
+                        'success': True,
+                        'local_path': local_path,
+                        'branch': result['branch'],
+                        'synced': True,
+                        'message': f'Repository {repo_name} refreshed from remote'
+                    }
             
-            # Prepare URL with token if provided
-            if github_token:
-                parsed_url = urlparse(github_url)
-                auth_url = f"https://{github_token}@{parsed_url.netloc}{parsed_url.path}"
-            else:
-                auth_url = github_url
+            if clone_options.get('use_object_cache'):
+                # Borrow objects from the shared per-upstream store; if it can't be
+                # refreshed, fall back to a plain clone
+                reference_url = clone_options.get('reference_url') or github_url
+                try:
+                    clone_kwargs['reference_if_able'] = self.object_cache.update(
+                        reference_url,
+                        self._auth_env(github_token) if reference_url == github_url else None
+                    )
+                except GitCommandError:
+                    pass
             
-            # Clone the repository
-            repo = Repo.clone_from(auth_url, local_path)
+            staging_path = tempfile.mkdtemp(dir=self.base_repos_dir, prefix=f'.{repo_name}.clone-')
+            try:
+                # Token goes through the environment so it's never written to .git/config
+                repo = InstrumentedRepo.clone_from(
+                    github_url, staging_path, progress=progress, env=self._auth_env(github_token), **clone_kwargs
+                )
+                
+                sparse = clone_options.get('sparse')
+                if sparse:
+                    repo.git.sparse_checkout('set', '--cone', '--', *sparse)
+                
+                branch = repo.active_branch.name
+                self._write_commit_graph(repo)
+                repo.close()
+                
+                # A checkout's .git only holds relative paths, so it can move
+                with self.repo_locks.write(local_path):
+                    if os.path.exists(local_path):
+                        self._remove_checkout(local_path)
+                    os.rename(staging_path, local_path)
+            finally:
+                if os.path.exists(staging_path):
+                    shutil.rmtree(staging_path)
             return {
                 'success': True,
                 'local_path': local_path,
-                'branch': repo.active_branch.name,
+                'branch': branch,
                 'message': f'Repository {repo_name} cloned successfully'
             }
+        except ValueError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'message': 'Invalid clone options'
+            }
+        except RepoBusy as e:
+            return _busy_result(e)
         except GitCommandError as e:
             return {
                 'success': False,
@@ -48,28 +179,285 @@ class GitManager:
                 'message': 'Unexpected error during cloning'
             }
     
-    def get_repository_status(self, local_path):
-        """Get the current status of a Git repository"""
+    @metrics.timed_operation('sync')
+    def sync_repository(self, local_path, github_token=None, branch=None, mode='fast-forward', progress=None, github_url=None):
+        """Fetch into an existing checkout and move it to the tracked branch.
+
+        ``fast-forward`` refuses to discard local commits; ``reset`` force-checks
+        out the remote branch. A checkout that is no longer a valid repository
+        is re-cloned from github_url when it is given.
+
+        The fetch only touches objects and remote-tracking refs, so it runs
+        under the read lock; the write lock is taken for the checkout alone.
+        """
+        if mode not in SYNC_MODES:
+            return {
+                'success': False,
+                'error': f'mode must be one of: {", ".join(SYNC_MODES)}',
+                'message': 'Invalid sync mode'
+            }
+        
+        if not self._is_valid_checkout(local_path):
+            if not github_url:
+                return {
+                    'success': False,
+                    'error': 'Invalid Git repository',
+                    'message': 'The checkout is corrupt and no remote URL was given to re-clone it'
+                }
+            # Replaced once the new clone is in place
+            result = self.clone_repository(github_url, os.path.basename(local_path), github_token, progress=progress)
+            if result['success']:
+                result['recloned'] = True
+            return result
+        
         try:
-            repo = Repo(local_path)
+            self._scrub_remote_url(local_path)
+            with self.repo_locks.read(local_path), self.repo_pool.acquire(local_path) as repo:
+                branch = branch or repo.active_branch.name
+                remote_ref = f'origin/{branch}'
+                
+                # Token goes through the environment so it's never written to .git/config
+                repo.remote('origin').fetch(
+                    f'+refs/heads/{branch}:refs/remotes/{remote_ref}',
+                    progress=progress,
+                    env=self._auth_env(github_token)
+                )
             
-            # Get modified files
-            modified_files = [item.a_path for item in repo.index.diff(None)]
+            with self.repo_locks.write(local_path), self.repo_pool.acquire(local_path) as repo:
+                previous_head = repo.head.commit.hexsha
+                if mode == 'reset':
+                    repo.git.checkout('-f', '-B', branch, remote_ref)
+                else:
+                    if repo.head.is_detached or repo.active_branch.name != branch:
+                        repo.git.checkout(branch)
+                    repo.git.merge('--ff-only', remote_ref)
+                
+                head = repo.head.commit.hexsha
             
-            # Get untracked files
-            untracked_files = repo.untracked_files
+            self.status_cache.invalidate(local_path)
             
-            # Get staged files
-            staged_files = [item.a_path for item in repo.index.diff("HEAD")]
+            return {
+                'success': True,
+                'branch': branch,
+                'previous_head': previous_head,
+                'head': head,
+                'updated': head != previous_head,
+                'recloned': False,
+                'message': 'Repository synced with remote'
+            }
+        except RepoBusy as e:
+            return _busy_result(e)
+        except GitCommandError as e:
+            return {
+                'success': False,
+                'error': f'Git error: {str(e)}',
+                'message': 'Failed to sync repository'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'message': 'Unexpected error during sync'
+            }
+    
+    @metrics.timed_operation('log')
+    @_locked(READ)
+    def get_commit_log(self, local_path, ref='HEAD', paths=None, author=None, after=None, limit=100, with_count=False):
+        """Get one page of the repository's own git log"""
+        try:
+            with self.repo_pool.acquire(local_path) as repo:
+                self._ensure_commit_graph(local_path, repo)
+                entries = list(iter_log_with_positions(repo, ref, paths, author, after, limit + 1))
+                total = count_commits(repo, ref, paths, author) if with_count and not after else None
+            
+            next_cursor = None
+            if len(entries) > limit:
+                entries = entries[:limit]
+                position, last = entries[-1]
+                next_cursor = log_cursor(last['commit_hash'], position)
+            commits = [commit for _, commit in entries]
+            
+            return {
+                'success': True,
+                'commits': commits,
+                'next_cursor': next_cursor,
+                'total_count': total
+            }
+        except ValueError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'message': 'Invalid log parameters'
+            }
+        except GitCommandError as e:
+            return {
+                'success': False,
+                'error': f'Git error: {str(e)}',
+                'message': 'Failed to read commit log'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'message': 'Unexpected error while reading commit log'
+            }
+    
+    def stream_commit_log(self, local_path, ref='HEAD', paths=None, author=None, after=None, limit=None):
+        """Yield log entries one at a time, holding the repo only while iterating"""
+        with self.repo_pool.acquire(local_path) as repo:
+            self._ensure_commit_graph(local_path, repo)
+            yield from iter_log(repo, ref, paths, author, after, limit)
+    
+    def _ensure_commit_graph(self, local_path, repo):
+        """Write a commit-graph in the background for repos that lack one"""
+        if has_commit_graph(repo):
+            return
+        with self._commit_graph_lock:
+            if local_path in self._commit_graph_pending:
+                return
+            self._commit_graph_pending.add(local_path)
+        
+        def write():
+            try:
+                with self.repo_pool.acquire(local_path) as pooled:
+                    self._write_commit_graph(pooled)
+            finally:
+                with self._commit_graph_lock:
+                    self._commit_graph_pending.discard(local_path)
+        
+        threading.Thread(target=write, daemon=True).start()
+    
+    def _write_commit_graph(self, repo):
+        try:
+            write_commit_graph(repo)
+        except GitCommandError:
+            # Older git or a repository without commits; history still works, just slower
+            pass
+    
+    def _is_valid_checkout(self, local_path):
+        """Whether local_path is a readable repository with a resolvable HEAD"""
+        try:
+            with self.repo_pool.acquire(local_path) as repo:
+                repo.git.rev_parse('--verify', 'HEAD')
+            return True
+        except (InvalidGitRepositoryError, NoSuchPathError, GitCommandError):
+            self.repo_pool.discard(local_path)
+            return False
+    
+    def _is_checkout_of(self, local_path, github_url):
+        """Whether local_path is a valid checkout whose origin is github_url"""
+        if not self._is_valid_checkout(local_path):
+            return False
+        try:
+            with self.repo_pool.acquire(local_path) as repo:
+                return normalize_url(repo.remote('origin').url) == normalize_url(github_url)
+        except ValueError:
+            # No origin remote
+            return False
+    
+    def _checkout_matches(self, local_path, clone_options):
+        """Whether local_path was cloned with the depth, filter, sparse and single-branch options given"""
+        with self.repo_pool.acquire(local_path) as repo:
+            shallow = os.path.exists(os.path.join(repo.git_dir, 'shallow'))
+            if shallow != (clone_options.get('depth') is not None):
+                return False
+            if _git_config(repo, 'remote.origin.partialclonefilter') != clone_options.get('filter'):
+                return False
+            all_branches = '+refs/heads/*:refs/remotes/origin/*' in _git_config(repo, 'remote.origin.fetch', all_values=True)
+            # --depth implies --single-branch
+            single_branch = clone_options.get('single_branch') or clone_options.get('depth') is not None
+            if all_branches == bool(single_branch):
+                return False
+            sparse = clone_options.get('sparse')
+            if _git_config(repo, 'core.sparsecheckout') != 'true':
+                return not sparse
+            if not sparse:
+                return False
+            current = repo.git.sparse_checkout('list').splitlines()
+            return sorted(current) == sorted(path.strip('/') for path in sparse)
+    
+    def _remote_default_branch(self, local_path):
+        """The branch origin/HEAD points at, as recorded by clone; None if unknown"""
+        with self.repo_pool.acquire(local_path) as repo:
+            try:
+                return repo.git.symbolic_ref('--short', 'refs/remotes/origin/HEAD').partition('/')[2] or None
+            except GitCommandError:
+                return None
+    
+    def _remove_checkout(self, local_path):
+        self.status_cache.discard(local_path)
+        self.repo_pool.discard(local_path)
+        if os.path.exists(local_path):
+            shutil.rmtree(local_path)
+    
+    def _scrub_remote_url(self, local_path):
+        """Drop credentials that older clones embedded in origin's URL"""
+        with self.repo_pool.acquire(local_path) as repo:
+            url = repo.remote('origin').url
+        clean = _without_credentials(url)
+        if clean != url:
+            with self.repo_locks.write(local_path), self.repo_pool.acquire(local_path) as repo:
+                repo.git.remote('set-url', 'origin', clean)
+    
+    def _auth_env(self, github_token):
+        """Environment that authenticates HTTPS git traffic with github_token"""
+        if not github_token:
+            return None
+        credentials = base64.b64encode(f'x-access-token:{github_token}'.encode('utf-8')).decode('ascii')
+        return {
+            'GIT_CONFIG_COUNT': '1',
+            'GIT_CONFIG_KEY_0': 'http.extraHeader',
+            'GIT_CONFIG_VALUE_0': f'Authorization: Basic {credentials}'
+        }
+    
+    def _clone_kwargs(self, clone_options):
+        """Validate clone_options and translate them into git clone flags"""
+        kwargs = {}
+        
+        depth = clone_options.get('depth')
+        if depth is not None:
+            if not isinstance(depth, int) or isinstance(depth, bool) or depth < 1:
+                raise ValueError('depth must be a positive integer')
+            kwargs['depth'] = depth
+        
+        clone_filter = clone_options.get('filter')
+        if clone_filter is not None:
+            if clone_filter not in CLONE_FILTERS:
+                raise ValueError(f'filter must be one of: {", ".join(CLONE_FILTERS)}')
+            kwargs['filter'] = clone_filter
+        
+        sparse = clone_options.get('sparse')
+        if sparse is not None:
+            if not isinstance(sparse, list) or not all(isinstance(p, str) and p for p in sparse):
+                raise ValueError('sparse must be a list of directory patterns')
+            kwargs['sparse'] = True
+        
+        if clone_options.get('single_branch'):
+            kwargs['single_branch'] = True
+        if clone_options.get('branch'):
+            kwargs['branch'] = clone_options['branch']
+        
+        return kwargs
+    
+    @metrics.timed_operation('status')
+    def get_repository_status(self, local_path):
+        """Get the current status of a Git repository"""
+        try:
+            # Simultaneous pollers of one checkout share a single refresh
+            status = self._single_flight.do(
+                ('status', os.path.realpath(local_path)),
+                lambda: self._read_status(local_path)
+            )
             
             return {
                 'success': True,
-                'branch': repo.active_branch.name,
-                'modified_files': modified_files,
-                'untracked_files': list(untracked_files),
-                'staged_files': staged_files,
-                'is_dirty': repo.is_dirty(),
-                'ahead_behind': self._get_ahead_behind_count(repo)
+                'branch': status['branch'],
+                'modified_files': status['modified_files'],
+                'untracked_files': status['untracked_files'],
+                'staged_files': status['staged_files'],
+                'is_dirty': status['is_dirty'],
+                'ahead_behind': status['ahead_behind'],
+                'etag': status.get('etag')
             }
         except InvalidGitRepositoryError:
             return {
@@ -84,25 +472,52 @@ class GitManager:
                 'message': 'Failed to get repository status'
             }
     
+    def status_etag(self, local_path):
+        """Tag of the status get_repository_status would return, if known without running git"""
+        return self.status_cache.etag(local_path)
+    
+    def _read_status(self, local_path):
+        with self.repo_locks.read(local_path), self.repo_pool.acquire(local_path) as repo:
+            # Answered from the watcher cache, re-examining only changed paths
+            return self.status_cache.get_status(repo, local_path, ahead_behind=self._upstream_counts)
+    
+    @metrics.timed_operation('add')
+    @_locked(WRITE)
     def add_files(self, local_path, file_paths=None):
         """Add files to the Git staging area"""
         try:
-            repo = Repo(local_path)
+            with self.repo_pool.acquire(local_path) as repo:
+                if file_paths is None:
+                    # Add all files
+                    repo.git.add(A=True)
+                    added_files = "all files"
+                    self.status_cache.invalidate(local_path)
+                    return {
+                        'success': True,
+                        'added_files': added_files,
+                        'message': 'Files added to staging area successfully'
+                    }
+                
+                # Add specific files in one batched git invocation
+                added_files, failed_files = stage_paths(repo, local_path, file_paths)
+            
+            self.status_cache.mark_changed(local_path, added_files)
+            self.status_cache.acknowledge_metadata(local_path)
             
-            if file_paths is None:
-                # Add all files
-                repo.git.add(A=True)
-                added_files = "all files"
-            else:
-                # Add specific files
-                for file_path in file_paths:
-                    repo.git.add(file_path)
-                added_files = file_paths
+            if failed_files and not added_files:
+                return {
+                    'success': False,
+                    'error': 'None of the requested files could be staged',
+                    'failed_files': failed_files,
+                    'message': 'Failed to add files'
+                }
             
             return {
                 'success': True,
                 'added_files': added_files,
-                'message': 'Files added to staging area successfully'
+                'failed_files': failed_files,
+                'message': 'Files added to staging area successfully' if not failed_files
+                    else f'Staged {len(added_files)} files, {len(failed_files)} failed'
             }
         except GitCommandError as e:
             return {
@@ -117,36 +532,38 @@ class GitManager:
                 'message': 'Unexpected error while adding files'
             }
     
+    @metrics.timed_operation('commit')
+    @_locked(WRITE)
     def commit_changes(self, local_path, message, author_name="GitEasy User", author_email="user@giteasy.com"):
         """Commit staged changes"""
         try:
-            repo = Repo(local_path)
-            
-            # Check if there are staged changes
-            if not repo.index.diff("HEAD"):
-                return {
-                    'success': False,
-                    'error': 'No staged changes to commit',
-                    'message': 'Please stage some changes before committing'
-                }
+            with self.repo_pool.acquire(local_path) as repo:
+                # Check if there are staged changes
+                if not repo.index.diff("HEAD"):
+                    return {
+                        'success': False,
+                        'error': 'No staged changes to commit',
+                        'message': 'Please stage some changes before committing'
+                    }
             
-            # Configure user if not set
-            try:
-                repo.config_reader().get_value("user", "name")
-            except:
-                repo.config_writer().set_value("user", "name", author_name).release()
-                repo.config_writer().set_value("user", "email", author_email).release()
+                # Configure user if not set
+                try:
+                    repo.config_reader().get_value("user", "name")
+                except:
+                    repo.config_writer().set_value("user", "name", author_name).release()
+                    repo.config_writer().set_value("user", "email", author_email).release()
             
-            # Commit changes
-            commit = repo.index.commit(message)
+                # Commit changes
+                commit = repo.index.commit(message)
+                self.status_cache.invalidate(local_path)
             
-            return {
-                'success': True,
-                'commit_hash': commit.hexsha,
-                'message': message,
-                'author': f"{author_name} <{author_email}>",
-                'timestamp': datetime.fromtimestamp(commit.committed_date).isoformat()
-            }
+                return {
+                    'success': True,
+                    'commit_hash': commit.hexsha,
+                    'message': message,
+                    'author': f"{author_name} <{author_email}>",
+                    'timestamp': datetime.fromtimestamp(commit.committed_date).isoformat()
+                }
         except GitCommandError as e:
             return {
                 'success': False,
@@ -160,89 +577,256 @@ class GitManager:
                 'message': 'Unexpected error during commit'
             }
     
-    def push_changes(self, local_path, github_token=None, branch='main'):
-        """Push committed changes to GitHub"""
+    @metrics.timed_operation('commit_uploads')
+    @_locked(WRITE)
+    def commit_uploaded_files(self, local_path, files, message, author_name="GitEasy User", author_email="user@giteasy.com", update_worktree=True):
+        """Commit uploaded files directly to the current branch.
+
+        Blobs and trees are written straight into the object database and the
+        branch ref is moved with a compare-and-swap, so neither the worktree
+        nor the index is scanned. With update_worktree the checkout is then
+        fast-forwarded to the new commit; otherwise only the index is.
+        """
         try:
-            repo = Repo(local_path)
+            uploads = {}
+            for file in files:
+                uploads[safe_relative_path(local_path, file.filename)] = file.stream
+            if not uploads:
+                return {
+                    'success': False,
+                    'error': 'No files provided',
+                    'message': 'Please upload at least one file to commit'
+                }
             
-            # Check if there are commits to push
-            try:
-                commits_ahead = list(repo.iter_commits(f'origin/{branch}..{branch}'))
-                if not commits_ahead:
+            with self.repo_pool.acquire(local_path) as repo:
+                if repo.head.is_detached:
                     return {
                         'success': False,
-                        'error': 'No commits to push',
-                        'message': 'Repository is up to date with remote'
+                        'error': 'HEAD is detached',
+                        'message': 'Check out a branch before committing'
+                    }
+                branch_ref = repo.head.reference
+                parent = branch_ref.commit if branch_ref.is_valid() else None
+                
+                with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+                    blobs = dict(zip(uploads, pool.map(
+                        lambda stream: store_blob(repo, *seekable_upload(stream)),
+                        uploads.values()
+                    )))
+                
+                tree_binsha = build_tree(repo, parent.tree.binsha if parent else None, blobs)
+                if parent is not None and tree_binsha == parent.tree.binsha:
+                    return {
+                        'success': False,
+                        'error': 'No changes to commit',
+                        'message': 'The uploaded files are identical to the current branch'
+                    }
+                
+                actor = Actor(author_name, author_email)
+                commit = Commit.create_from_tree(
+                    repo,
+                    Tree(repo, tree_binsha),
+                    message,
+                    parent_commits=[parent] if parent else [],
+                    author=actor,
+                    committer=actor
+                )
+                
+                # Fails if another commit landed on the branch in the meantime
+                old_sha = parent.hexsha if parent else '0' * 40
+                repo.git.update_ref('-m', f'commit: {commit.summary}', branch_ref.path, commit.hexsha, old_sha)
+                
+                try:
+                    if parent is not None:
+                        if update_worktree:
+                            repo.git.read_tree('-m', '-u', old_sha, commit.hexsha)
+                        else:
+                            repo.git.read_tree('-m', old_sha, commit.hexsha)
+                    else:
+                        repo.git.read_tree(*(['-u'] if update_worktree else []), '--reset', commit.hexsha)
+                except GitCommandError as e:
+                    # read-tree checks everything before writing, so only the
+                    # ref has moved: put it back
+                    if parent is not None:
+                        repo.git.update_ref('-m', 'giteasy: undo upload commit', branch_ref.path, old_sha, commit.hexsha)
+                    else:
+                        repo.git.update_ref('-d', branch_ref.path, commit.hexsha)
+                    return {
+                        'success': False,
+                        'error': f'Git error: {str(e)}',
+                        'message': 'Uploaded files conflict with uncommitted changes in the checkout'
                     }
-            except:
-                # If we can't check, proceed with push anyway
-                pass
-            
-            # Push changes
-            if github_token:
-                # Update remote URL with token
-                origin = repo.remote('origin')
-                original_url = origin.url
-                parsed_url = urlparse(original_url)
-                auth_url = f"https://{github_token}@{parsed_url.netloc}{parsed_url.path}"
-                origin.set_url(auth_url)
             
-            origin = repo.remote('origin')
-            push_info = origin.push(branch)
+            self.status_cache.invalidate(local_path)
             
             return {
                 'success': True,
-                'pushed_commits': len(commits_ahead) if 'commits_ahead' in locals() else 'unknown',
-                'message': 'Changes pushed to GitHub successfully'
+                'commit_hash': commit.hexsha,
+                'message': message,
+                'author': f"{author_name} <{author_email}>",
+                'timestamp': datetime.fromtimestamp(commit.committed_date).isoformat(),
+                'committed_files': sorted(blobs),
+                'worktree_updated': update_worktree
+            }
+        except ValueError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'message': 'Invalid upload'
             }
         except GitCommandError as e:
             return {
                 'success': False,
                 'error': f'Git error: {str(e)}',
-                'message': 'Failed to push changes to GitHub'
+                'message': 'Failed to commit uploaded files'
             }
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e),
-                'message': 'Unexpected error during push'
+                'message': 'Unexpected error while committing uploaded files'
             }
     
-    def _get_ahead_behind_count(self, repo):
-        """Get how many commits ahead/behind the local branch is"""
+    @metrics.timed_operation('push')
+    @_locked(READ)
+    def push_changes(self, local_path, github_token=None, branch='main', progress=None):
+        """Push committed changes to GitHub.
+
+        Pushing reads the checkout and only moves the remote-tracking ref,
+        so status reads carry on while it runs.
+        """
         try:
-            branch = repo.active_branch
-            remote_branch = f'origin/{branch.name}'
+            with self.repo_pool.acquire(local_path) as repo:
+                # Check if there are commits to push
+                commits_ahead = None
+                try:
+                    commits_ahead = self._count_ahead_behind(repo, branch, f'origin/{branch}')['ahead']
+                    if not commits_ahead:
+                        return {
+                            'success': False,
+                            'error': 'No commits to push',
+                            'message': 'Repository is up to date with remote'
+                        }
+                except:
+                    # If we can't check, proceed with push anyway
+                    pass
             
-            ahead = list(repo.iter_commits(f'{remote_branch}..{branch.name}'))
-            behind = list(repo.iter_commits(f'{branch.name}..{remote_branch}'))
+                # Token goes through the environment, as for fetch: rewriting the
+                # remote URL would write .git/config under a read lock
+                origin = repo.remote('origin')
+                push_info = origin.push(branch, progress=progress, env=self._auth_env(github_token))
             
+                return {
+                    'success': True,
+                    'pushed_commits': commits_ahead if commits_ahead is not None else 'unknown',
+                    'message': 'Changes pushed to GitHub successfully'
+                }
+        except GitCommandError as e:
+            if is_auth_error(str(e)):
+                # Cached validation/permission results for this token are stale
+                token_cache.invalidate(github_token)
+                return {
+                    'success': False,
+                    'error': f'Git error: {str(e)}',
+                    'message': 'GitHub rejected the credentials for this push',
+                    'auth_failed': True
+                }
             return {
-                'ahead': len(ahead),
-                'behind': len(behind)
+                'success': False,
+                'error': f'Git error: {str(e)}',
+                'message': 'Failed to push changes to GitHub'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'message': 'Unexpected error during push'
             }
-        except:
+    
+    def _upstream_counts(self, repo, head_sha, upstream):
+        """Ahead/behind of head_sha against the tracking branch upstream, for status"""
+        try:
+            # Resolved from the ref files, without a git process
+            upstream_sha = repo.rev_parse(upstream).hexsha
+        except (BadName, ValueError):
+            # Upstream configured but not fetched, or gone
             return {'ahead': 0, 'behind': 0}
+        return self._count_between(repo, head_sha, upstream_sha)
+    
+    def _count_ahead_behind(self, repo, local_ref, remote_ref):
+        """Count commits only in local_ref / only in remote_ref"""
+        local_sha, remote_sha = repo.git.rev_parse(local_ref, remote_ref).split()
+        return self._count_between(repo, local_sha, remote_sha)
+    
+    def _count_between(self, repo, local_sha, remote_sha):
+        """Count commits only in local_sha / only in remote_sha.
+
+        Uses a single ``rev-list --left-right --count`` traversal, which walks
+        with commit-graph generation numbers when the graph file exists and
+        never materialises Commit objects. Results are memoized on the pair of
+        tip SHAs, which status and push both go through, so repeated polls of
+        an unchanged branch cost nothing.
+        """
+        key = (local_sha, remote_sha)
+        
+        with self._ahead_behind_lock:
+            counts = self._ahead_behind_cache.get(key)
+            if counts is not None:
+                self._ahead_behind_cache.move_to_end(key)
+                return dict(counts)
+        
+        if local_sha == remote_sha:
+            counts = {'ahead': 0, 'behind': 0}
+        else:
+            # Concurrent callers for the same pair of tips share one traversal
+            counts = self._single_flight.do(('ahead-behind', key), lambda: self._rev_list_counts(repo, local_sha, remote_sha))
+        
+        with self._ahead_behind_lock:
+            self._ahead_behind_cache[key] = counts
+            while len(self._ahead_behind_cache) > AHEAD_BEHIND_CACHE_SIZE:
+                self._ahead_behind_cache.popitem(last=False)
+        return dict(counts)
+    
+    def _rev_list_counts(self, repo, local_sha, remote_sha):
+        ahead, behind = repo.git.rev_list('--left-right', '--count', f'{local_sha}...{remote_sha}').split()
+        return {'ahead': int(ahead), 'behind': int(behind)}
     
+    @metrics.timed_operation('save_uploads')
+    @_locked(WRITE)
     def save_uploaded_files(self, local_path, files):
-        """Save uploaded files to the repository directory"""
+        """Save uploaded files to the repository directory, skipping unchanged ones"""
         try:
-            saved_files = []
-            
+            # Keyed by path so a file uploaded twice is only written once (last wins)
+            uploads = {}
             for file in files:
-                file_path = os.path.join(local_path, file.filename)
+                uploads[safe_relative_path(local_path, file.filename)] = file.stream
+            
+            with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+                # Hash every upload as a git blob before touching the worktree
+                hashed = list(pool.map(lambda upload: (upload[0],) + hash_upload(upload[1]), uploads.items()))
                 
-                # Create directory if it doesn't exist
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                unchanged = set()
+                with self.repo_pool.acquire(local_path) as repo:
+                    indexed = index_blobs(repo, [rel_path for rel_path, _, _, _ in hashed])
+                    candidates = [rel_path for rel_path, sha, _, _ in hashed if indexed.get(rel_path) == sha]
+                    if candidates:
+                        unchanged = set(candidates) - worktree_changed(repo, candidates)
                 
-                # Save the file
-                file.save(file_path)
-                saved_files.append(file.filename)
+                to_write = [(rel_path, stream) for rel_path, _, _, stream in hashed if rel_path not in unchanged]
+                list(pool.map(lambda upload: write_upload(upload[1], os.path.join(local_path, upload[0])), to_write))
+            
+            saved_files = [rel_path for rel_path, _ in to_write]
+            unchanged_files = [rel_path for rel_path, _, _, _ in hashed if rel_path in unchanged]
+            
+            self.status_cache.mark_changed(local_path, saved_files)
             
             return {
                 'success': True,
                 'saved_files': saved_files,
-                'message': f'Successfully saved {len(saved_files)} files'
+                'unchanged_files': unchanged_files,
+                'written_count': len(saved_files),
+                'unchanged_count': len(unchanged_files),
+                'message': f'Successfully saved {len(saved_files)} files ({len(unchanged_files)} unchanged)'
             }
         except Exception as e:
             return {
@@ -250,4 +834,3 @@ class GitManager:
                 'error': str(e),
                 'message': 'Failed to save uploaded files'
             }
-
@@ -0,0 +1,327 @@
+"""Shared client for the GitHub REST API.
+
+One pooled ``requests.Session`` is reused for every call, so handlers no
+longer pay a TCP+TLS handshake per request, and every call has a timeout.
+GET responses are kept in an LRU cache keyed by a hash of the token plus the
+URL; repeat requests are sent as conditional requests (ETag /
+Last-Modified) and a 304 is answered from the cache. GitHub doesn't count
+304s against the rate limit. Calls are paced per token by a
+RateLimitScheduler fed from each response's rate-limit headers.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from werkzeug.datastructures import Headers
+from src.services import metrics
+from src.services.rate_limiter import RateLimitScheduler, RateLimited, INTERACTIVE
+
+DEFAULT_API_URL = 'https://api.github.com'
+ACCEPT = 'application/vnd.github.v3+json'
+# Response headers worth replaying from the cache
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Link', 'X-OAuth-Scopes', 'Content-Type')
+PAGE_WORKERS = 4
+# Extra attempts after a secondary rate limit response
+RETRIES = 1
+
+
+class GitHubError(Exception):
+    """A GitHub API call answered with a non-2xx status"""
+
+    def __init__(self, response, message=None):
+        super().__init__(message or f'GitHub API returned {response.status_code}')
+        self.response = response
+        self.status_code = response.status_code
+
+
+def token_key(token):
+    """Stable, non-reversible identifier for a token"""
+    return hashlib.sha256((token or '').encode('utf-8')).hexdigest()
+
+
+class GitHubResponse:
+    """The parts of an HTTP response the routes use, live or from the cache"""
+
+    def __init__(self, status_code, headers, content, from_cache=False):
+        self.status_code = status_code
+        self.headers = Headers()
+        for name, value in dict(headers).items():
+            self.headers.set(name, value)
+        self.content = content
+        self.from_cache = from_cache
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 300
+
+    @property
+    def links(self):
+        """Link header as {rel: url}"""
+        header = self.headers.get('Link')
+        if not header:
+            return {}
+        from requests.utils import parse_header_links
+        return {link['rel']: link['url'] for link in parse_header_links(header) if 'rel' in link}
+
+    def json(self):
+        return json.loads(self.content) if self.content else None
+
+
+class ResponseCache:
+    """LRU of cacheable GET responses, optionally backed by a directory"""
+
+    def __init__(self, max_entries=1024, cache_dir=None, max_disk_entries=10000):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        entry = self._read_disk(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # Touch so the on-disk LRU sees the hit
+            os.utime(self._path(key))
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.cache_dir:
+            return
+        temp_path = f'{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            return
+        self._disk_writes += 1
+        if self._disk_writes % 100 == 0:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        try:
+            entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith('.json')]
+        except OSError:
+            return
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_disk_entries]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+
+class GitHubClient:
+    """Pooled, caching GitHub API client"""
+
+    def __init__(self, base_url=None, timeout=(5, 30), pool_size=20, cache=None, scheduler=None):
+        self.base_url = (base_url or os.environ.get('GITHUB_API_URL') or DEFAULT_API_URL).rstrip('/')
+        self.timeout = timeout
+        self.cache = cache if cache is not None else ResponseCache(
+            cache_dir=os.environ.get('GITEASY_GITHUB_CACHE_DIR')
+        )
+        self.scheduler = scheduler if scheduler is not None else RateLimitScheduler()
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Created on first use, so requests is only imported when needed and a
+        # pre-fork master never hands its sockets to the workers
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def url(self, path):
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return f'{self.base_url}/{path.lstrip("/")}'
+
+    def get(self, path, token=None, params=None, use_cache=True, priority=INTERACTIVE):
+        """GET path (or an absolute URL from a Link header) as token
+
+        Throttled by the per-token scheduler; a call it refuses comes back as a
+        429 response with a Retry-After header.
+        """
+        url = self.url(path)
+        headers = {'Accept': ACCEPT}
+        if token:
+            headers['Authorization'] = f'token {token}'
+
+        key = None
+        cached = None
+        if use_cache:
+            request_id = json.dumps([url, sorted((params or {}).items())], default=str)
+            key = hashlib.sha256(f'{token_key(token)}:{request_id}'.encode('utf-8')).hexdigest()
+            cached = self.cache.get(key)
+            if cached is not None:
+                if cached['headers'].get('ETag'):
+                    headers['If-None-Match'] = cached['headers']['ETag']
+                if cached['headers'].get('Last-Modified'):
+                    headers['If-Modified-Since'] = cached['headers']['Last-Modified']
+
+        budget_key = token_key(token)
+        for attempt in range(RETRIES + 1):
+            try:
+                with self.scheduler.slot(budget_key, priority):
+                    response = self._send(url, headers, params)
+            except RateLimited as e:
+                body = json.dumps({'message': str(e)}).encode('utf-8')
+                return GitHubResponse(429, {'Retry-After': str(int(e.retry_after) + 1), 'Content-Type': 'application/json'}, body)
+            self.scheduler.record(budget_key, response.status_code, response.headers)
+            # Secondary rate limits name a wait; the scheduler holds the retry until then
+            if response.status_code not in (403, 429) or 'Retry-After' not in response.headers:
+                break
+
+        if response.status_code == 304 and cached is not None:
+            # Fresh rate-limit headers, cached body
+            merged = dict(cached['headers'])
+            merged.update(response.headers)
+            return GitHubResponse(cached['status_code'], merged, cached['content'].encode('utf-8'), from_cache=True)
+
+        if key and response.status_code == 200 and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            self.cache.put(key, {
+                'status_code': response.status_code,
+                'headers': {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers},
+                'content': response.content.decode('utf-8', 'replace')
+            })
+
+        return GitHubResponse(response.status_code, response.headers, response.content)
+
+    def _send(self, url, headers, params):
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.session.get(url, headers=headers, params=params, timeout=self.timeout)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.github_request_duration.observe(elapsed, endpoint=_endpoint(url, self.base_url), status=status)
+            metrics.record('github', elapsed)
+
+    def iter_pages(self, path, token=None, params=None, max_workers=PAGE_WORKERS, priority=INTERACTIVE):
+        """Yield each page of a paginated list endpoint, in order.
+
+        The first page is fetched on its own. If its Link header names the
+        last page, the rest are requested concurrently on a bounded pool and
+        yielded as soon as every earlier page is out; otherwise the ``next``
+        links are followed one at a time. Raises GitHubError on a failed page.
+        """
+        response = self.get(path, token, params=params, priority=priority)
+        if not response.ok:
+            raise GitHubError(response)
+        yield response.json()
+
+        links = response.links
+        last_page = _page_number(links.get('last'))
+        if last_page is None:
+            next_url = links.get('next')
+            while next_url:
+                response = self.get(next_url, token, priority=priority)
+                if not response.ok:
+                    raise GitHubError(response)
+                yield response.json()
+                next_url = response.links.get('next')
+            return
+
+        page_urls = [_with_page(links['last'], page) for page in range(2, last_page + 1)]
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(page_urls) or 1))) as pool:
+            futures = [pool.submit(metrics.propagate(self.get), url, token, priority=priority) for url in page_urls]
+            try:
+                for future in futures:
+                    response = future.result()
+                    if not response.ok:
+                        raise GitHubError(response)
+                    yield response.json()
+            finally:
+                # Consumer stopped or a page failed: don't fetch the remainder
+                for future in futures:
+                    future.cancel()
+
+
+def _endpoint(url, base_url):
+    """url's path with owner, repository and ids templated, for metric labels"""
+    path = urlsplit(url).path
+    base_path = urlsplit(base_url).path.rstrip('/')
+    if base_path and path.startswith(base_path):
+        path = path[len(base_path):]
+    segments = [segment for segment in path.split('/') if segment]
+    for index, segment in enumerate(segments):
+        previous = segments[index - 1] if index else None
+        if index == 1 and previous in ('repos', 'users', 'orgs'):
+            segments[index] = '{owner}'
+        elif index == 2 and segments[0] == 'repos':
+            segments[index] = '{repo}'
+        elif previous in ('collaborators', 'branches'):
+            segments[index] = '{name}'
+        elif segment.isdigit() or (len(segment) == 40 and all(c in '0123456789abcdef' for c in segment)):
+            segments[index] = '{id}'
+    return '/' + '/'.join(segments)
+
+
+def _page_number(url):
+    if not url:
+        return None
+    for name, value in parse_qsl(urlsplit(url).query):
+        if name == 'page' and value.isdigit():
+            return int(value)
+    return None
+
+
+def _with_page(url, page):
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query) if name != 'page']
+    query.append(('page', str(page)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+github_client = GitHubClient()
@@ -0,0 +1,150 @@
+"""Commit log read straight from git, plus commit-graph maintenance.
+
+``git log`` is streamed and parsed record by record, so a page of 100 and an
+NDJSON export of a million commits both run in constant memory. Repositories
+keep a split commit-graph with changed-path Bloom filters, which lets git
+skip commit parsing for history walks and counts and skip tree diffs for
+path-filtered logs.
+"""
+import itertools
+import os
+from src.services.status_engine import iter_records, iter_stream
+
+LOG_FIELDS = ('commit_hash', 'parents', 'author_name', 'author_email', 'timestamp', 'message')
+# One NUL-terminated token per field; -z terminates each commit's last field too
+LOG_FORMAT = '%H%x00%P%x00%an%x00%ae%x00%at%x00%s'
+
+
+def _check_revision(ref):
+    # Ends up as a positional argument; never let it be read as an option
+    if ref.startswith('-'):
+        raise ValueError(f'Invalid ref: {ref}')
+
+
+def log_cursor(commit_hash, position):
+    """Cursor for resuming a log listing below the commit at position (1 = tip)"""
+    return f'{commit_hash}.{position}'
+
+
+def _parse_cursor(after):
+    sha, _, position = after.partition('.')
+    if not (4 <= len(sha) <= 40 and all(c in '0123456789abcdef' for c in sha.lower())):
+        raise ValueError('after must be a cursor from a previous page or a commit SHA')
+    if position and not position.isdigit():
+        raise ValueError('after must be a cursor from a previous page or a commit SHA')
+    return sha.lower(), int(position) if position else None
+
+
+def _log_command(ref, paths=None, author=None, skip=None, limit=None):
+    command = ['git', 'log', '-z', f'--format={LOG_FORMAT}']
+    if author:
+        command.append(f'--author={author}')
+    if skip:
+        command.append(f'--skip={skip}')
+    if limit:
+        command.append(f'--max-count={limit}')
+    command.extend([ref, '--'])
+    if paths:
+        command.extend(':(literal)' + path for path in paths)
+    return command
+
+
+def _iter_commits(repo, command):
+    proc = repo.git.execute(command, as_process=True)
+    finished = False
+    try:
+        fields = []
+        for token in iter_records(iter_stream(proc.stdout)):
+            fields.append(token.decode('utf-8', 'replace'))
+            if len(fields) == len(LOG_FIELDS):
+                commit = dict(zip(LOG_FIELDS, fields))
+                commit['parents'] = commit['parents'].split()
+                commit['timestamp'] = int(commit['timestamp'])
+                yield commit
+                fields = []
+        finished = True
+    finally:
+        if finished:
+            # Raises GitCommandError for a bad ref
+            proc.wait()
+        else:
+            # Stop git promptly if the consumer goes away mid-stream
+            proc.proc.kill()
+            proc.proc.wait()
+
+
+def iter_log_with_positions(repo, ref='HEAD', paths=None, author=None, after=None, limit=None):
+    """Yield (position, commit) from ``git log ref`` as they are produced.
+
+    after resumes below a commit, given as a log_cursor or a bare SHA; the
+    walk always starts from ref, so commits reached through any parent of a
+    merge are kept. With the cursor's position, git skips straight to it;
+    if new commits have moved it (or only a SHA is given), ref is walked
+    until the cursor commit comes up.
+    """
+    _check_revision(ref)
+    if not after:
+        commits = _iter_commits(repo, _log_command(ref, paths, author, limit=limit))
+        try:
+            yield from enumerate(commits, 1)
+        finally:
+            commits.close()
+        return
+
+    sha, position = _parse_cursor(after)
+    if position:
+        commits = _iter_commits(repo, _log_command(ref, paths, author, skip=position - 1, limit=limit + 1 if limit else None))
+        try:
+            first = next(commits, None)
+            if first is not None and first['commit_hash'].startswith(sha):
+                yield from enumerate(commits, position + 1)
+                return
+        finally:
+            commits.close()
+
+    commits = _iter_commits(repo, _log_command(ref, paths, author))
+    try:
+        for index, commit in enumerate(commits, 1):
+            if commit['commit_hash'].startswith(sha):
+                yield from itertools.islice(enumerate(commits, index + 1), limit)
+                return
+        raise ValueError('after is not a commit in the history of ref')
+    finally:
+        commits.close()
+
+
+def iter_log(repo, ref='HEAD', paths=None, author=None, after=None, limit=None):
+    """Yield commit dicts from ``git log`` as they are produced"""
+    entries = iter_log_with_positions(repo, ref, paths, author, after, limit)
+    try:
+        for _, commit in entries:
+            yield commit
+    finally:
+        entries.close()
+
+
+def count_commits(repo, ref='HEAD', paths=None, author=None):
+    """Number of commits reachable from ref matching the filters"""
+    _check_revision(ref)
+    command = ['rev-list', '--count']
+    if author:
+        command.append(f'--author={author}')
+    command.extend([ref, '--'])
+    if paths:
+        command.extend(':(literal)' + path for path in paths)
+    return int(repo.git.execute(['git'] + command))
+
+
+def has_commit_graph(repo):
+    info_dir = os.path.join(repo.git_dir, 'objects', 'info')
+    return os.path.exists(os.path.join(info_dir, 'commit-graph')) or \
+        os.path.isdir(os.path.join(info_dir, 'commit-graphs'))
+
+
+def write_commit_graph(repo):
+    """Write or extend the split commit-graph with changed-path filters"""
+    with repo.config_writer() as config:
+        config.set_value('core', 'commitGraph', 'true')
+        # Keep the graph current on every later fetch without our involvement
+        config.set_value('fetch', 'writeCommitGraph', 'true')
+    repo.git.commit_graph('write', '--reachable', '--split', '--changed-paths')
@@ -0,0 +1,73 @@
+"""GitPython classes that time every git subprocess.
+
+``InstrumentedRepo`` runs its commands through ``InstrumentedGit``, which
+reports each one to the metrics module as (subcommand, exit code, seconds).
+Commands started with ``as_process=True`` (streamed output) are timed from
+spawn until the caller waits on them.
+"""
+import time
+from git import Git, GitCommandError, Repo
+from src.services import metrics
+
+
+def _subcommand(command):
+    if isinstance(command, str):
+        command = command.split()
+    args = iter(command[1:] if command and str(command[0]).endswith('git') else command)
+    for arg in args:
+        arg = str(arg)
+        if arg in ('-c', '-C', '--git-dir', '--work-tree', '--namespace'):
+            # Global option with a separate value
+            next(args, None)
+            continue
+        if not arg.startswith('-'):
+            return arg
+    return 'unknown'
+
+
+def _observe(command, exit_code, started):
+    elapsed = time.perf_counter() - started
+    metrics.git_command_duration.observe(elapsed, command=command, exit_code=exit_code)
+    metrics.record('git', elapsed)
+
+
+class InstrumentedGit(Git):
+    class AutoInterrupt(Git.AutoInterrupt):
+        __slots__ = ('started', 'recorded')
+
+        def __init__(self, proc, args):
+            super().__init__(proc, args)
+            self.started = time.perf_counter()
+            self.recorded = False
+
+        def wait(self, stderr=b''):
+            try:
+                status = super().wait(stderr)
+            except GitCommandError as e:
+                self._record(e.status)
+                raise
+            self._record(status)
+            return status
+
+        def _record(self, status):
+            if not self.recorded:
+                self.recorded = True
+                _observe(_subcommand(self.args), status, self.started)
+
+    def execute(self, command, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = super().execute(command, *args, **kwargs)
+        except GitCommandError as e:
+            _observe(_subcommand(command), e.status, started)
+            raise
+        if isinstance(result, Git.AutoInterrupt):
+            # Timed when the caller waits on it
+            return result
+        status = result[0] if kwargs.get('with_extended_output') and isinstance(result, tuple) else 0
+        _observe(_subcommand(command), status, started)
+        return result
+
+
+class InstrumentedRepo(Repo):
+    GitCommandWrapperType = InstrumentedGit
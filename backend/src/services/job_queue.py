@@ -0,0 +1,274 @@
+"""Background execution of long git operations (clone, push, ...).
+
+Jobs are rows in the ``job`` table so their state is visible to every worker
+process and survives restarts; the work itself runs on a bounded thread pool.
+"""
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from src.models import db
+from src.models.job import Job
+
+SIZE_UNITS = {'bytes': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3}
+SIZE_PATTERN = re.compile(r'([\d.]+) (bytes|KiB|MiB|GiB)')
+
+
+class JobError(Exception):
+    """Raised by a job handler to fail the job with a user-facing message"""
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting to run"""
+
+
+@lru_cache(maxsize=None)
+def _progress_class():
+    # GitPython is only imported once a job actually runs
+    from git import RemoteProgress
+
+    phases = (
+        (RemoteProgress.COUNTING, 'counting'),
+        (RemoteProgress.COMPRESSING, 'compressing'),
+        (RemoteProgress.WRITING, 'writing'),
+        (RemoteProgress.RECEIVING, 'receiving'),
+        (RemoteProgress.RESOLVING, 'resolving'),
+        (RemoteProgress.FINDING_SOURCES, 'finding_sources'),
+        (RemoteProgress.CHECKING_OUT, 'checking_out'),
+    )
+
+    class JobProgress(RemoteProgress):
+        """Translate git's progress lines into phase/object/byte counters"""
+
+        def __init__(self, callback):
+            super().__init__()
+            self.callback = callback
+
+        def update(self, op_code, cur_count, max_count=None, message=''):
+            phase = None
+            for code, name in phases:
+                if op_code & code:
+                    phase = name
+                    break
+            bytes_received = None
+            match = SIZE_PATTERN.search(message or '')
+            if match:
+                bytes_received = int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+            self.callback(phase, cur_count, max_count, bytes_received)
+
+    return JobProgress
+
+
+def JobProgress(callback):
+    """RemoteProgress that reports through callback(phase, cur, max, bytes)"""
+    return _progress_class()(callback)
+
+
+class JobQueue:
+    """Bounded worker pool running registered job handlers"""
+
+    def __init__(self, max_workers=4, max_pending=64, progress_interval=0.5):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.progress_interval = progress_interval
+        self.app = None
+        self._handlers = {}
+        self._executor = None
+        self._executor_pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def worker_id(self):
+        # Evaluated lazily so forked worker processes report their own pid
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def init_app(self, app, start=True):
+        """Bind to the Flask app; start() now unless start is False"""
+        self.app = app
+        if start:
+            self.start()
+
+    def start(self):
+        """Start this process's workers and resume jobs left over from a previous run.
+
+        A process forked from one that had already started gets its own
+        workers, since threads don't survive a fork.
+        """
+        if self._ensure_executor():
+            with self.app.app_context():
+                self._resume_pending()
+
+    def _ensure_executor(self):
+        """Create this process's worker pool if needed; True if it was created"""
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                return False
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='giteasy-job')
+            self._executor_pid = os.getpid()
+            self._pending = 0
+            return True
+
+    def register(self, kind, handler):
+        """Register handler(params, secrets, progress) for a job kind"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind, params, secrets=None, repository_id=None):
+        """Persist a new job and schedule it; secrets are never written to the DB"""
+        if kind not in self._handlers:
+            raise ValueError(f'Unknown job kind: {kind}')
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull('Too many jobs are already queued')
+            self._pending += 1
+
+        stored_params = dict(params, requires_secrets=bool(secrets))
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            status='queued',
+            repository_id=repository_id,
+            params=json.dumps(stored_params),
+            # The owner until claimed; it alone holds the secrets
+            worker=self.worker_id
+        )
+        try:
+            db.session.add(job)
+            db.session.commit()
+            self._ensure_executor()
+            self._executor.submit(self._run, job.id, secrets or {})
+        except Exception as e:
+            with self._lock:
+                self._pending -= 1
+            db.session.rollback()
+            self._abandon(job.id, e)
+            raise
+        return job
+
+    def _abandon(self, job_id, error):
+        # A queued row owned by this live worker would never be run by anyone
+        try:
+            Job.query.filter_by(id=job_id, status='queued').update({
+                'status': 'failed',
+                'error': f'Could not be scheduled: {error}',
+                'finished_at': datetime.utcnow()
+            })
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+
+    def _resume_pending(self):
+        # Jobs that were running in a process that no longer exists go back to the queue
+        for job in Job.query.filter_by(status='running').all():
+            if not self._worker_alive(job.worker):
+                job.status = 'queued'
+        db.session.commit()
+
+        for job in Job.query.filter_by(status='queued').order_by(Job.created_at).all():
+            if self._worker_alive(job.worker):
+                # Queued by a live sibling process, which will run it itself
+                continue
+            params = json.loads(job.params)
+            if params.get('requires_secrets'):
+                # Credentials were only held in memory by the process that died
+                self._finish(job, 'failed', error='Job was interrupted by a restart; please resubmit it')
+                continue
+            with self._lock:
+                self._pending += 1
+            self._executor.submit(self._run, job.id, {})
+
+    def _worker_alive(self, worker):
+        if not worker:
+            return False
+        host, _, pid = worker.rpartition(':')
+        if host != socket.gethostname():
+            # Can't check processes on other hosts; assume they're still working
+            return True
+        if int(pid) == os.getpid():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _run(self, job_id, secrets):
+        try:
+            with self.app.app_context():
+                # Claim the job atomically so only one worker process runs it
+                claimed = Job.query.filter_by(id=job_id, status='queued').update({
+                    'status': 'running',
+                    'worker': self.worker_id,
+                    'started_at': datetime.utcnow()
+                })
+                db.session.commit()
+                if not claimed:
+                    return
+
+                job = db.session.get(Job, job_id)
+                params = json.loads(job.params)
+                handler = self._handlers.get(job.kind)
+                progress = JobProgress(self._progress_callback(job))
+                try:
+                    if handler is None:
+                        raise JobError(f'No handler registered for job kind {job.kind}')
+                    result = handler(params, secrets, progress)
+                except JobError as e:
+                    db.session.rollback()
+                    self._finish(job, 'failed', error=str(e))
+                except Exception as e:
+                    db.session.rollback()
+                    self._finish(job, 'failed', error=f'Unexpected error: {e}')
+                else:
+                    self._finish(job, 'succeeded', result=result)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _progress_callback(self, job):
+        job_id = job.id
+        last_write = [0.0]
+
+        def callback(phase, cur_count, max_count, bytes_received):
+            now = time.monotonic()
+            finished = max_count and cur_count >= max_count
+            if now - last_write[0] < self.progress_interval and not finished:
+                return
+            last_write[0] = now
+            values = {}
+            if phase:
+                values['phase'] = phase
+            if cur_count is not None:
+                values['objects_received'] = int(cur_count)
+            if max_count:
+                values['objects_total'] = int(max_count)
+                values['progress'] = round(100.0 * cur_count / max_count, 1)
+            if bytes_received is not None:
+                values['bytes_received'] = bytes_received
+            # GitPython reports progress from its stream-pumping thread, so write
+            # through a context of our own rather than the job's session
+            with self.app.app_context():
+                Job.query.filter_by(id=job_id).update(values)
+                db.session.commit()
+
+        return callback
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = json.dumps(result) if result is not None else None
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        if status == 'succeeded':
+            job.progress = 100.0
+        db.session.commit()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,269 @@
+"""Prometheus metrics and per-request timing profiles.
+
+Counters and histograms live in this process and are rendered in the
+Prometheus text format at ``/metrics`` (set GITEASY_METRICS_TOKEN to require
+``Authorization: Bearer <token>``, here and on ``/api/internal/stats``). Under a multi-worker server each worker
+reports its own numbers.
+
+Besides route latency, the hot paths report here: GitManager operations
+(``timed_operation``), every git subprocess (``InstrumentedGit``), SQL
+statements (engine events) and outbound GitHub calls. The same timings are
+summed per request; a request sent with ``X-GitEasy-Profile: 1`` gets them
+back in a ``Server-Timing`` header.
+"""
+import contextvars
+import functools
+import hmac
+import os
+import threading
+import time
+from flask import Response, abort, g, request
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+PROFILE_HEADER = 'X-GitEasy-Profile'
+
+_profile = contextvars.ContextVar('giteasy_request_profile', default=None)
+_profile_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, [('le', _format_number(bound))])
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {_format_number(series["sum"])}')
+                lines.append(f'{self.name}_count{labels} {series["count"]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+http_request_duration = registry.histogram(
+    'giteasy_http_request_duration_seconds', 'Time to produce an HTTP response, by route',
+    ('method', 'route', 'status')
+)
+http_request_sql_queries = registry.histogram(
+    'giteasy_http_request_sql_queries', 'SQL statements executed per HTTP request, by route',
+    ('route',), buckets=COUNT_BUCKETS
+)
+sql_query_duration = registry.histogram(
+    'giteasy_sql_query_duration_seconds', 'SQL statement latency, by statement type', ('statement',)
+)
+git_operation_duration = registry.histogram(
+    'giteasy_git_operation_duration_seconds', 'GitManager operation latency, by operation and outcome',
+    ('operation', 'outcome')
+)
+git_command_duration = registry.histogram(
+    'giteasy_git_command_duration_seconds', 'git subprocess latency, by subcommand and exit code',
+    ('command', 'exit_code')
+)
+github_request_duration = registry.histogram(
+    'giteasy_github_request_duration_seconds', 'GitHub API call latency, by endpoint and status',
+    ('endpoint', 'status')
+)
+errors_total = registry.counter(
+    'giteasy_errors_total', 'Errors caught and logged instead of failing the request', ('where',)
+)
+
+
+def record(category, seconds):
+    """Add seconds to the current request's profile under category"""
+    profile = _profile.get()
+    if profile is not None:
+        with _profile_lock:
+            entry = profile.setdefault(category, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+
+def propagate(fn):
+    """fn bound to a copy of the current context, for running on a pool thread
+
+    Work it does there still counts towards the submitting request's profile.
+    """
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def timed_operation(name):
+    """Time a GitManager method; the outcome comes from its result's 'success'"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = method(*args, **kwargs)
+                if isinstance(result, dict) and 'success' in result:
+                    outcome = 'success' if result['success'] else 'failure'
+                else:
+                    outcome = 'success'
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                git_operation_duration.observe(elapsed, operation=name, outcome=outcome)
+        return wrapper
+    return decorator
+
+
+def init_app(app, db):
+    """Time requests and SQL statements and serve /metrics"""
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(db.engine, 'handle_error', _handle_cursor_error)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+    app.add_url_rule('/metrics', 'metrics', _metrics_view)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Keyed by execution: a failed statement never reaches after_cursor_execute
+    conn.info.setdefault('giteasy_query_started', {})[context] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('giteasy_query_started', {}).pop(context, None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+    sql_query_duration.observe(elapsed, statement=keyword)
+    record('sql', elapsed)
+
+
+def _handle_cursor_error(exception_context):
+    if exception_context.connection is not None:
+        exception_context.connection.info.get('giteasy_query_started', {}).pop(
+            exception_context.execution_context, None
+        )
+
+
+def _start_request():
+    g.giteasy_started = time.perf_counter()
+    g.giteasy_profile_token = _profile.set({})
+
+
+def _finish_request(response):
+    started = g.get('giteasy_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_request_duration.observe(elapsed, method=request.method, route=route, status=response.status_code)
+
+    profile = _profile.get() or {}
+    http_request_sql_queries.observe(profile.get('sql', [0, 0.0])[0], route=route)
+    if request.headers.get(PROFILE_HEADER):
+        timings = [f'total;dur={elapsed * 1000:.1f}']
+        for category, (count, seconds) in sorted(profile.items()):
+            timings.append(f'{category};dur={seconds * 1000:.1f};desc="{count} calls"')
+        response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+
+def _end_request(exc):
+    token = g.pop('giteasy_profile_token', None)
+    if token is not None:
+        _profile.reset(token)
+
+
+def require_metrics_token():
+    """Abort with 401 unless the request carries GITEASY_METRICS_TOKEN, when one is set"""
+    token = os.environ.get('GITEASY_METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {token}'.encode('utf-8')):
+            abort(401)
+
+
+def _metrics_view():
+    require_metrics_token()
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,67 @@
+"""Shared bare object stores used as ``--reference`` for clones.
+
+One bare repository is kept per upstream URL. Clones borrow its objects via
+``.git/objects/info/alternates``, so re-cloning a repository, or cloning a
+fork of the same upstream, only transfers objects the cache doesn't have.
+
+The cache is never pruned or gc'd with ``--prune``: checkouts referencing it
+would lose objects they depend on.
+"""
+import hashlib
+import os
+import threading
+from urllib.parse import urlparse
+from src.services.instrumented_git import InstrumentedRepo
+
+
+def normalize_url(url):
+    """Canonical form of a remote URL, without credentials or a .git suffix"""
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower()
+    path = parsed.path.rstrip('/')
+    if path.endswith('.git'):
+        path = path[:-4]
+    return f'{host}{path.lower()}'
+
+
+class ObjectCache:
+    """Directory of bare object stores keyed by normalized upstream URL"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def path_for(self, url):
+        key = hashlib.sha1(normalize_url(url).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{key}.git')
+
+    def update(self, url, env=None):
+        """Create or refresh the cache for url and return its path.
+
+        env may carry credentials (see GitManager._auth_env); they are only
+        seen by the fetch and never stored in the cache's config.
+        """
+        path = self.path_for(url)
+        with self._lock_for(path):
+            if os.path.isdir(path):
+                repo = InstrumentedRepo(path)
+            else:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                repo = InstrumentedRepo.init(path, bare=True)
+                # Automatic gc could prune objects that borrowing clones rely on
+                repo.config_writer().set_value('gc', 'auto', '0').release()
+            try:
+                repo.git.fetch(
+                    url,
+                    '+refs/heads/*:refs/heads/*',
+                    '+refs/tags/*:refs/tags/*',
+                    env=env
+                )
+            finally:
+                repo.close()
+        return path
+
+    def _lock_for(self, path):
+        with self._locks_lock:
+            return self._locks.setdefault(path, threading.Lock())
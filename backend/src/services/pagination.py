@@ -0,0 +1,81 @@
+"""Keyset (cursor) pagination helpers for list endpoints.
+
+A cursor is the sort key of the last row on the previous page, encoded as an
+opaque URL-safe string. Filtering on ``sort key > cursor`` lets the database
+seek straight to the page through an index, so page cost doesn't grow with
+how deep into the table the client is.
+
+Cursors come back from clients, so ``page_args`` checks their shape against
+the route's sort key before any value reaches a query.
+"""
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid pagination cursor')
+
+
+def cursor_id(value):
+    """Cursor element holding an integer primary key"""
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError('Invalid pagination cursor')
+    return value
+
+
+def cursor_timestamp(value):
+    """Cursor element holding an ISO 8601 timestamp"""
+    if not isinstance(value, str):
+        raise ValueError('Invalid pagination cursor')
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError('Invalid pagination cursor')
+
+
+def page_limit(args):
+    """Parse the ``limit`` query argument, clamped to MAX_PAGE_SIZE"""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def page_args(args, key=(cursor_id,)):
+    """Parse ``limit`` and ``after`` query arguments into (limit, cursor values).
+
+    key lists one parser per element of the sort key; each raises ValueError
+    for a value of the wrong type. The cursor values come back parsed.
+    """
+    limit = page_limit(args)
+    after = args.get('after')
+    if not after:
+        return limit, None
+    values = decode_cursor(after)
+    if not isinstance(values, list) or len(values) != len(key):
+        raise ValueError('Invalid pagination cursor')
+    return limit, [parse(value) for parse, value in zip(key, values)]
+
+
+def split_page(rows, limit, cursor_for):
+    """Trim a limit + 1 row fetch to a page and compute the next cursor"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(cursor_for(rows[-1]))
+    return rows, None
@@ -0,0 +1,172 @@
+"""Per-token scheduling of outbound GitHub API calls.
+
+Every response's rate-limit headers update the budget tracked for its token.
+Before a call goes out, the scheduler:
+
+* caps how many calls per token are in flight, granting free slots to
+  interactive callers before background ones;
+* holds every call while GitHub has asked us to stop (``Retry-After`` or an
+  exhausted budget) until the window reopens;
+* keeps the last ``reserve`` calls of a window for interactive callers and
+  paces them with jittered delays as the budget runs out, so the remaining
+  calls spread over the time left instead of all failing together.
+
+A call that would have to wait longer than ``max_wait`` is refused; the
+client reports that as a 429 with a ``Retry-After``.
+"""
+import hashlib
+import hmac
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITIES = {'interactive': INTERACTIVE, 'background': BACKGROUND}
+
+
+class RateLimited(Exception):
+    """A call was refused because the token's budget will not reopen soon enough"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'GitHub rate limit reached; retry in {int(retry_after) + 1}s')
+        self.retry_after = retry_after
+
+
+class _Budget:
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self.waiting = [0, 0]
+        self.throttled = 0
+        self.refused = 0
+
+
+class RateLimitScheduler:
+    """Track per-token budgets and gate calls by priority"""
+
+    def __init__(self, max_concurrent=8, reserve=100, low_water=0.1, max_wait=30.0, max_pace_delay=2.0):
+        self.max_concurrent = max_concurrent
+        self.reserve = reserve
+        self.low_water = low_water
+        self.max_wait = max_wait
+        self.max_pace_delay = max_pace_delay
+        self._budgets = {}
+        # Stats name budgets by an HMAC under a per-process secret, never by
+        # the (unsalted) token hash they are keyed on
+        self._label_secret = secrets.token_bytes(16)
+        self._condition = threading.Condition()
+
+    def _budget(self, key):
+        budget = self._budgets.get(key)
+        if budget is None:
+            budget = self._budgets[key] = _Budget()
+        return budget
+
+    def _hold_until(self, budget, priority, now):
+        """Wall-clock time before which a call may not start, or None"""
+        hold = budget.blocked_until if budget.blocked_until > now else None
+        if budget.remaining is not None and budget.reset_at and budget.reset_at > now:
+            floor = self.reserve if priority == BACKGROUND else 0
+            if budget.remaining <= floor:
+                # Jitter so every waiter doesn't retry in the same instant
+                reset = budget.reset_at + random.uniform(0, 1)
+                hold = max(hold or 0, reset)
+        return hold
+
+    def _pace_delay(self, budget, now):
+        """Jittered delay spreading a nearly spent budget over the time left"""
+        if not budget.limit or budget.remaining is None or not budget.reset_at:
+            return 0
+        if budget.remaining > budget.limit * self.low_water or budget.reset_at <= now:
+            return 0
+        interval = (budget.reset_at - now) / max(budget.remaining, 1)
+        return random.uniform(0, min(interval, self.max_pace_delay))
+
+    @contextmanager
+    def slot(self, key, priority=INTERACTIVE):
+        """Hold one of key's call slots for the duration of a request"""
+        deadline = time.monotonic() + self.max_wait
+        with self._condition:
+            budget = self._budget(key)
+            budget.waiting[priority] += 1
+            try:
+                while True:
+                    now = time.time()
+                    hold = self._hold_until(budget, priority, now)
+                    if hold is not None and hold - now > deadline - time.monotonic():
+                        budget.refused += 1
+                        raise RateLimited(hold - now)
+                    busy = budget.in_flight >= self.max_concurrent or (
+                        priority == BACKGROUND and budget.waiting[INTERACTIVE] > 0
+                    )
+                    if hold is None and not busy:
+                        break
+                    remaining_wait = deadline - time.monotonic()
+                    if remaining_wait <= 0:
+                        budget.refused += 1
+                        raise RateLimited(max(hold - now, 1) if hold else 1)
+                    budget.throttled += 1
+                    self._condition.wait(min(hold - now, remaining_wait) if hold else remaining_wait)
+                budget.in_flight += 1
+                delay = self._pace_delay(budget, time.time())
+            finally:
+                budget.waiting[priority] -= 1
+                self._condition.notify_all()
+        try:
+            if delay:
+                time.sleep(delay)
+            yield
+        finally:
+            with self._condition:
+                budget.in_flight -= 1
+                self._condition.notify_all()
+
+    def record(self, key, status_code, headers):
+        """Update key's budget from a response"""
+        now = time.time()
+        with self._condition:
+            budget = self._budget(key)
+            if headers.get('X-RateLimit-Limit', '').isdigit():
+                budget.limit = int(headers['X-RateLimit-Limit'])
+            if headers.get('X-RateLimit-Remaining', '').isdigit():
+                budget.remaining = int(headers['X-RateLimit-Remaining'])
+            if headers.get('X-RateLimit-Reset', '').isdigit():
+                budget.reset_at = int(headers['X-RateLimit-Reset'])
+
+            if status_code in (403, 429):
+                retry_after = headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    # Secondary rate limit
+                    budget.blocked_until = max(budget.blocked_until, now + int(retry_after))
+                elif budget.remaining == 0 and budget.reset_at:
+                    budget.blocked_until = max(budget.blocked_until, budget.reset_at)
+                elif status_code == 429:
+                    budget.blocked_until = max(budget.blocked_until, now + 60)
+            self._condition.notify_all()
+
+    def _label(self, key):
+        return hmac.new(self._label_secret, key.encode('utf-8'), hashlib.sha256).hexdigest()[:12]
+
+    def stats(self):
+        now = time.time()
+        with self._condition:
+            return {
+                self._label(key): {
+                    'limit': budget.limit,
+                    'remaining': budget.remaining,
+                    'reset_in': max(0, int(budget.reset_at - now)) if budget.reset_at else None,
+                    'blocked_for': max(0, round(budget.blocked_until - now, 1)),
+                    'in_flight': budget.in_flight,
+                    'waiting_interactive': budget.waiting[INTERACTIVE],
+                    'waiting_background': budget.waiting[BACKGROUND],
+                    'throttled': budget.throttled,
+                    'refused': budget.refused
+                }
+                for key, budget in self._budgets.items()
+            }
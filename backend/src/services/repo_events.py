@@ -0,0 +1,279 @@
+"""Server-Sent Events for repository status and job progress.
+
+A repository with at least one subscriber has a single producer thread that
+checks its status and jobs once per ``poll_interval``. Status is re-read only
+when the status cache says something changed (see GitManager.status_etag),
+and the result is fanned out to every subscriber: a full ``status`` event for
+new subscribers, ``status-delta`` events afterwards, and ``job`` events when a
+job's state or progress moves.
+
+Each subscriber has a bounded buffer. A client that falls that far behind has
+its backlog dropped and gets a fresh full snapshot, so one slow reader never
+holds up the producer or grows memory without limit. Idle streams get a
+comment line every ``heartbeat_interval`` to keep proxies from closing them.
+
+Under a threaded server every open stream occupies a request thread, so a
+worker accepts at most ``max_subscribers`` streams (default: half of
+GITEASY_THREADS, or GITEASY_SSE_MAX_SUBSCRIBERS) and turns further ones away
+with TooManySubscribers; those clients keep polling status instead. Streams
+also end after ``max_stream_seconds`` (GITEASY_SSE_MAX_SECONDS), and the
+browser's EventSource reconnects, possibly to a less busy worker.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from src.models import db
+from src.models.job import Job
+
+STATUS_LIST_FIELDS = ('modified_files', 'untracked_files', 'staged_files')
+STATUS_SCALAR_FIELDS = ('branch', 'is_dirty', 'ahead_behind', 'success', 'error', 'message')
+ACTIVE_JOB_STATUSES = ('queued', 'running')
+
+
+class TooManySubscribers(Exception):
+    """Raised when this process already serves its maximum number of streams"""
+
+
+def status_delta(old, new):
+    """Changes from status old to new: added/removed paths per list, changed scalars"""
+    delta = {}
+    for field in STATUS_LIST_FIELDS:
+        old_paths = set(old.get(field, ()))
+        new_paths = set(new.get(field, ()))
+        added = sorted(new_paths - old_paths)
+        removed = sorted(old_paths - new_paths)
+        if added or removed:
+            delta[field] = {'added': added, 'removed': removed}
+    for field in STATUS_SCALAR_FIELDS:
+        if old.get(field) != new.get(field):
+            delta[field] = new.get(field)
+    return delta
+
+
+def format_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """One client's bounded queue of formatted events"""
+
+    def __init__(self, repository_id, buffer_size, heartbeat_interval, max_seconds=None):
+        self.repository_id = repository_id
+        self.buffer_size = buffer_size
+        self.heartbeat_interval = heartbeat_interval
+        self.deadline = time.monotonic() + max_seconds if max_seconds else None
+        self.needs_snapshot = True
+        self.dropped = 0
+        self.closed = False
+        self._events = deque()
+        self._condition = threading.Condition()
+
+    def push(self, chunk):
+        """Queue chunk; returns False if the buffer overflowed and was dropped"""
+        with self._condition:
+            if len(self._events) >= self.buffer_size:
+                self.dropped += len(self._events)
+                self._events.clear()
+                self.needs_snapshot = True
+                self._condition.notify()
+                return False
+            self._events.append(chunk)
+            self._condition.notify()
+            return True
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+
+    def stream(self):
+        """Yield queued events as they arrive, with heartbeats in between"""
+        while self.deadline is None or time.monotonic() < self.deadline:
+            with self._condition:
+                if not self._events and not self.closed:
+                    self._condition.wait(self.heartbeat_interval)
+                if self.closed and not self._events:
+                    return
+                chunks = list(self._events)
+                self._events.clear()
+            if chunks:
+                yield ''.join(chunks)
+            else:
+                yield ': keep-alive\n\n'
+
+
+class _Producer:
+    """Poll one repository and fan its changes out to the subscribers"""
+
+    def __init__(self, hub, repository_id, local_path):
+        self.hub = hub
+        self.repository_id = repository_id
+        self.local_path = local_path
+        self.subscribers = set()
+        self.status = None
+        self.jobs = {}
+        self.jobs_polled_at = datetime.utcnow()
+        self.sequence = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f'repo-events-{repository_id}')
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.hub.app.app_context():
+                    self._poll_status()
+                    self._poll_jobs()
+                    db.session.remove()
+            except Exception as e:
+                self._broadcast('error', {'error': str(e), 'message': 'Failed to read repository events'})
+            self._stop.wait(self.hub.poll_interval)
+
+    def _poll_status(self):
+        last_etag = self.status.get('etag') if self.status else None
+        status = self.hub.status_source(self.repository_id, self.local_path, last_etag)
+        if status is not None:
+            previous, self.status = self.status, status
+            delta = status_delta(previous, status) if previous is not None else None
+            if delta:
+                self.sequence += 1
+                self._broadcast('status-delta', delta)
+        # New subscribers, and any that overflowed, get the full picture
+        self._send_snapshots()
+
+    def _poll_jobs(self):
+        # Active jobs, plus any that finished since the last poll (a short
+        # job can start and finish between two polls)
+        polled_at = datetime.utcnow()
+        condition = Job.status.in_(ACTIVE_JOB_STATUSES) | (Job.finished_at >= self.jobs_polled_at)
+        if self.jobs:
+            condition = condition | Job.id.in_(list(self.jobs))
+        self.jobs_polled_at = polled_at
+        for job in Job.query.filter(Job.repository_id == self.repository_id, condition).all():
+            data = job.to_dict()
+            if self.jobs.get(job.id) != data:
+                self.sequence += 1
+                self._broadcast('job', data)
+            if job.status in ACTIVE_JOB_STATUSES:
+                self.jobs[job.id] = data
+            else:
+                # Reported its final state; stop tracking it
+                self.jobs.pop(job.id, None)
+
+    def _current_subscribers(self):
+        # subscribe/unsubscribe change the set from request threads under the hub's lock
+        with self.hub._lock:
+            return list(self.subscribers)
+
+    def _send_snapshots(self):
+        for subscriber in self._current_subscribers():
+            if subscriber.needs_snapshot and self.status is not None:
+                self._send_snapshot(subscriber)
+
+    def _send_snapshot(self, subscriber):
+        subscriber.needs_snapshot = False
+        status = {key: value for key, value in self.status.items() if key != 'etag'}
+        chunks = [format_event('status', status, self.sequence)]
+        chunks.extend(format_event('job', job, self.sequence) for job in self.jobs.values())
+        # An overflow here sets needs_snapshot again, so the next poll retries
+        self._push(subscriber, ''.join(chunks))
+
+    def _push(self, subscriber, chunk):
+        if not subscriber.push(chunk):
+            with self.hub._lock:
+                self.hub.overflows += 1
+
+    def _broadcast(self, event, data):
+        chunk = format_event(event, data, self.sequence)
+        for subscriber in self._current_subscribers():
+            if not subscriber.needs_snapshot:
+                self._push(subscriber, chunk)
+
+
+class RepoEventHub:
+    """Registry of per-repository producers and their subscribers"""
+
+    def __init__(self, poll_interval=1.0, heartbeat_interval=15.0, buffer_size=64, max_subscribers=4,
+                 max_stream_seconds=300):
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.max_stream_seconds = max_stream_seconds
+        self.app = None
+        self.status_source = None
+        self.overflows = 0
+        self.rejected = 0
+        self._subscribers = 0
+        self._producers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        threads = int(os.environ.get('GITEASY_THREADS') or 8)
+        return cls(
+            max_subscribers=int(os.environ.get('GITEASY_SSE_MAX_SUBSCRIBERS') or max(1, threads // 2)),
+            max_stream_seconds=int(os.environ.get('GITEASY_SSE_MAX_SECONDS') or 300)
+        )
+
+    def init_app(self, app):
+        self.app = app
+
+    def register_status_source(self, source):
+        """source(repository_id, local_path, last_etag) -> status dict with 'etag', or None if unchanged"""
+        self.status_source = source
+
+    def subscribe(self, repository_id, local_path):
+        subscription = Subscription(repository_id, self.buffer_size, self.heartbeat_interval, self.max_stream_seconds)
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                self.rejected += 1
+                raise TooManySubscribers(f'This worker already serves {self.max_subscribers} event streams')
+            self._subscribers += 1
+            producer = self._producers.get(repository_id)
+            if producer is None:
+                producer = self._producers[repository_id] = _Producer(self, repository_id, local_path)
+                producer.subscribers.add(subscription)
+                producer.start()
+            else:
+                producer.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            producer = self._producers.get(subscription.repository_id)
+            if producer is None or subscription not in producer.subscribers:
+                return
+            self._subscribers -= 1
+            producer.subscribers.discard(subscription)
+            if not producer.subscribers:
+                # Last client gone: no one to produce for
+                del self._producers[subscription.repository_id]
+                producer.stop()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'repositories': len(self._producers),
+                'subscribers': self._subscribers,
+                'max_subscribers': self.max_subscribers,
+                'overflows': self.overflows,
+                'rejected': self.rejected
+            }
+
+
+repo_events = RepoEventHub.from_env()
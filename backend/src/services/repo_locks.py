@@ -0,0 +1,174 @@
+"""Per-repository reader/writer locks and single-flight coalescing.
+
+Git serializes writers through ``.git/index.lock`` by failing rather than
+waiting, so two writers (or a writer and a status refresh) on one checkout
+make one of them error out. ``RepoLocks`` queues them instead: any number of
+readers or one writer per checkout, within a process through a condition
+variable and across worker processes through ``flock`` on a lock file kept
+outside the checkout. Locks are reentrant per thread, so a write operation
+may call other locked operations on the same checkout.
+
+``SingleFlight`` lets identical concurrent reads share one computation.
+"""
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+READ = 'read'
+WRITE = 'write'
+
+
+class RepoBusy(TimeoutError):
+    """A repository lock could not be taken in time"""
+
+
+class _RWLock:
+    """Writer-preferring reader/writer lock"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    def acquire(self, mode, deadline):
+        with self.condition:
+            if mode == WRITE:
+                self.waiting_writers += 1
+                try:
+                    while self.writer or self.readers:
+                        if not self.condition.wait(max(0, deadline - time.monotonic())) and time.monotonic() >= deadline:
+                            return False
+                    self.writer = True
+                finally:
+                    self.waiting_writers -= 1
+            else:
+                # Waiting writers go first so steady polling can't starve them
+                while self.writer or self.waiting_writers:
+                    if not self.condition.wait(max(0, deadline - time.monotonic())) and time.monotonic() >= deadline:
+                        return False
+                self.readers += 1
+            return True
+
+    def release(self, mode):
+        with self.condition:
+            if mode == WRITE:
+                self.writer = False
+            else:
+                self.readers -= 1
+            self.condition.notify_all()
+
+
+class RepoLocks:
+    """Reader/writer locks keyed by checkout path"""
+
+    def __init__(self, lock_dir, timeout=120):
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._held = threading.local()
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def read(self, local_path):
+        return self.hold(local_path, READ)
+
+    def write(self, local_path):
+        return self.hold(local_path, WRITE)
+
+    @contextmanager
+    def hold(self, local_path, mode):
+        key = os.path.realpath(local_path)
+        held = self._held.__dict__.setdefault('locks', {})
+        if key in held:
+            if mode == WRITE and held[key][0] == READ:
+                raise RuntimeError(f'Cannot upgrade a read lock to a write lock on {local_path}')
+            held[key][1] += 1
+            try:
+                yield
+            finally:
+                held[key][1] -= 1
+            return
+
+        deadline = time.monotonic() + self.timeout
+        lock = self._lock_for(key)
+        if not lock.acquire(mode, deadline):
+            raise RepoBusy(f'Timed out waiting for a {mode} lock on {local_path}')
+        try:
+            lock_file = self._lock_file(key, mode, deadline)
+            try:
+                held[key] = [mode, 1]
+                try:
+                    yield
+                finally:
+                    del held[key]
+            finally:
+                if lock_file is not None:
+                    lock_file.close()
+        finally:
+            lock.release(mode)
+
+    def _lock_for(self, key):
+        with self._locks_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = _RWLock()
+            return lock
+
+    def _lock_file(self, key, mode, deadline):
+        """Open and flock the cross-process lock file for key"""
+        if fcntl is None:
+            return None
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.lock'
+        lock_file = open(os.path.join(self.lock_dir, name), 'a+')
+        operation = (fcntl.LOCK_EX if mode == WRITE else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        delay = 0.005
+        while True:
+            try:
+                fcntl.flock(lock_file.fileno(), operation)
+                return lock_file
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    lock_file.close()
+                    raise RepoBusy(f'Timed out waiting for another process\'s lock on {key}')
+                time.sleep(delay)
+                delay = min(delay * 2, 0.1)
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers share its outcome"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+            return call['result']
+        except BaseException as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from src.services.instrumented_git import InstrumentedRepo
+
+
+class _PooledPath:
+    """Idle Repo handles for one path plus the bookkeeping the pool needs"""
+
+    __slots__ = ('idle', 'last_used', 'in_use', 'evicted')
+
+    def __init__(self):
+        self.idle = []
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self.evicted = False
+
+
+class RepoPool:
+    """Bounded LRU pool of long-lived git.Repo handles keyed by path.
+
+    Keeping a Repo open avoids re-discovering the repository, re-reading its
+    config and restarting the persistent ``git cat-file`` helpers on every
+    request. A handle is lent to one borrower at a time, since GitPython's
+    cat-file pipes are not thread-safe; concurrent borrowers of the same path
+    get a handle each, and up to ``max_idle_per_path`` of them are kept when
+    returned. Paths that are idle for longer than ``idle_timeout`` seconds, or
+    that fall off the end of the LRU, have their handles closed.
+    """
+
+    def __init__(self, max_size=32, idle_timeout=300, max_idle_per_path=4):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_idle_per_path = max_idle_per_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def acquire(self, local_path):
+        """Borrow a Repo for local_path, not shared with anyone else, for a block"""
+        entry, repo = self._checkout(local_path)
+        try:
+            yield repo
+        finally:
+            self._checkin(entry, repo)
+
+    def discard(self, local_path):
+        """Drop and close the handles for local_path, e.g. before deleting it"""
+        key = self._key(local_path)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._retire(entry)
+
+    def close_all(self):
+        """Close every pooled handle"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            for entry in entries:
+                self._retire(entry)
+
+    def stats(self):
+        """Return hit/miss counters and current pool occupancy"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'idle_handles': sum(len(e.idle) for e in self._entries.values()),
+                'borrowed_handles': sum(e.in_use for e in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _key(self, local_path):
+        return os.path.realpath(local_path)
+
+    def _checkout(self, local_path):
+        key = self._key(local_path)
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _PooledPath()
+                while len(self._entries) > self.max_size:
+                    _, oldest = self._entries.popitem(last=False)
+                    self.evictions += 1
+                    self._retire(oldest)
+            self._entries.move_to_end(key)
+            entry.in_use += 1
+            entry.last_used = time.monotonic()
+            if entry.idle:
+                self.hits += 1
+                return entry, entry.idle.pop()
+            self.misses += 1
+
+        # Open outside the lock so a slow filesystem doesn't stall other repos
+        try:
+            return entry, InstrumentedRepo(key)
+        except Exception:
+            with self._lock:
+                entry.in_use -= 1
+            raise
+
+    def _checkin(self, entry, repo):
+        with self._lock:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            if not entry.evicted and len(entry.idle) < self.max_idle_per_path:
+                entry.idle.append(repo)
+                return
+        repo.close()
+
+    def _evict_idle(self):
+        if not self.idle_timeout:
+            return
+        cutoff = time.monotonic() - self.idle_timeout
+        for key in [k for k, e in self._entries.items() if e.last_used < cutoff and e.in_use == 0]:
+            self.evictions += 1
+            self._retire(self._entries.pop(key))
+
+    def _retire(self, entry):
+        # Handles still borrowed are closed on check-in
+        entry.evicted = True
+        idle, entry.idle = entry.idle, []
+        for repo in idle:
+            repo.close()
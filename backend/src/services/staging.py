@@ -0,0 +1,90 @@
+"""Stage many paths with a handful of git invocations.
+
+Paths are validated up front (outside the checkout, missing from both the
+worktree and the index, or ignored) so the remaining set can be handed to a
+single ``git add --pathspec-from-file``. If git still rejects the batch, it is
+bisected to isolate the offending paths instead of falling back to one
+process per file.
+"""
+import os
+import tempfile
+from git import GitCommandError
+from src.services.uploads import safe_relative_path, index_blobs
+
+
+def _pathspec_file(rel_paths):
+    """Temporary NUL-separated file of literal pathspecs"""
+    spec = tempfile.TemporaryFile()
+    for rel_path in rel_paths:
+        spec.write(rel_path.encode('utf-8', 'surrogateescape') + b'\0')
+    spec.seek(0)
+    return spec
+
+
+def _ignored(repo, rel_paths):
+    with _pathspec_file(rel_paths) as spec:
+        # check-ignore exits 1 when nothing is ignored
+        _, output, _ = repo.git.check_ignore(
+            '-z', '--stdin',
+            istream=spec,
+            with_extended_output=True,
+            with_exceptions=False
+        )
+    return {path for path in output.split('\0') if path}
+
+
+def _add_batch(repo, rel_paths, failures):
+    """git add rel_paths in one process, bisecting on error"""
+    if not rel_paths:
+        return []
+    with tempfile.NamedTemporaryFile(delete=False) as spec:
+        for rel_path in rel_paths:
+            spec.write(rel_path.encode('utf-8', 'surrogateescape') + b'\0')
+    try:
+        repo.git.add(
+            f'--pathspec-from-file={spec.name}',
+            '--pathspec-file-nul',
+            env={'GIT_LITERAL_PATHSPECS': '1'}
+        )
+        return list(rel_paths)
+    except GitCommandError as e:
+        if len(rel_paths) == 1:
+            failures.append({'path': rel_paths[0], 'error': (e.stderr or str(e)).strip()})
+            return []
+    finally:
+        os.unlink(spec.name)
+    middle = len(rel_paths) // 2
+    return _add_batch(repo, rel_paths[:middle], failures) + _add_batch(repo, rel_paths[middle:], failures)
+
+
+def stage_paths(repo, local_path, file_paths):
+    """Stage file_paths; return (staged paths, [{'path', 'error'}] failures)"""
+    failures = []
+    candidates = []
+    seen = set()
+    for file_path in file_paths:
+        try:
+            rel_path = safe_relative_path(local_path, file_path)
+        except ValueError as e:
+            failures.append({'path': file_path, 'error': str(e)})
+            continue
+        if rel_path not in seen:
+            seen.add(rel_path)
+            candidates.append(rel_path)
+
+    # Paths gone from the worktree can still be staged as deletions if tracked
+    missing = [p for p in candidates if not os.path.lexists(os.path.join(local_path, p))]
+    if missing:
+        tracked = index_blobs(repo, missing)
+        untracked_missing = {p for p in missing if p not in tracked}
+        for rel_path in untracked_missing:
+            failures.append({'path': rel_path, 'error': 'Path does not exist in the worktree or the index'})
+        candidates = [p for p in candidates if p not in untracked_missing]
+
+    existing = [p for p in candidates if os.path.lexists(os.path.join(local_path, p))]
+    ignored = _ignored(repo, existing) if existing else set()
+    for rel_path in sorted(ignored):
+        failures.append({'path': rel_path, 'error': 'Path is ignored by .gitignore'})
+
+    staged = _add_batch(repo, [p for p in candidates if p not in ignored], failures)
+    return staged, failures
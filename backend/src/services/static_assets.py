@@ -0,0 +1,149 @@
+"""In-memory manifest and precompressed serving for the built frontend.
+
+The static folder is scanned once at startup. Every file gets a strong ETag
+from its content, and compressible files get gzip and (when the ``brotli``
+package is installed) brotli variants, taken from ``.gz``/``.br`` files built
+alongside them or compressed here otherwise. Requests are then answered from
+the manifest without touching the filesystem. Fingerprinted build output
+(``assets/index-B3vgRZA-.js``) is cached by browsers for a year; everything
+else, ``index.html`` included, is revalidated with its ETag.
+
+The manifest reflects the folder at startup; restart after a frontend build.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Vite's default output names: <name>-<8+ char base64url hash>.<ext>
+FINGERPRINT_PATTERN = re.compile(r'-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 512
+# Larger files are served from disk, uncompressed
+MAX_MEMORY_SIZE = 8 * 1024 * 1024
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+# Preferred first
+ENCODINGS = ('br', 'gzip')
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+class _Asset:
+    __slots__ = ('path', 'content_type', 'etag', 'cache_control', 'variants')
+
+    def __init__(self, path, content_type, etag, cache_control, variants):
+        self.path = path
+        self.content_type = content_type
+        self.etag = etag
+        self.cache_control = cache_control
+        # encoding ('identity', 'gzip', 'br') -> bytes, or None to stream from path
+        self.variants = variants
+
+
+class StaticAssets:
+    """Serve the files under static_dir from a manifest built once"""
+
+    def __init__(self, static_dir, index='index.html'):
+        self.static_dir = static_dir
+        self.index = index
+        self.assets = {}
+        if static_dir and os.path.isdir(static_dir):
+            self._scan()
+
+    def _scan(self):
+        for root, _, files in os.walk(self.static_dir):
+            for name in files:
+                if name.endswith(('.gz', '.br')) and os.path.exists(os.path.join(root, name[:-3])):
+                    # A precompressed variant, picked up with its source file
+                    continue
+                full_path = os.path.join(root, name)
+                rel_path = os.path.relpath(full_path, self.static_dir).replace(os.sep, '/')
+                self.assets[rel_path] = self._load(rel_path, full_path)
+
+    def _load(self, rel_path, full_path):
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        cache_control = IMMUTABLE if FINGERPRINT_PATTERN.search(rel_path) else REVALIDATE
+
+        size = os.path.getsize(full_path)
+        if size > MAX_MEMORY_SIZE:
+            digest = hashlib.sha256()
+            with open(full_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            return _Asset(full_path, content_type, digest.hexdigest()[:32], cache_control, {'identity': None})
+
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        variants = {'identity': data}
+        if size >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            for encoding in ENCODINGS:
+                compressed = self._precompressed(full_path, encoding)
+                if compressed is None:
+                    compressed = self._compress(data, encoding)
+                if compressed is not None and len(compressed) < size:
+                    variants[encoding] = compressed
+        return _Asset(full_path, content_type, hashlib.sha256(data).hexdigest()[:32], cache_control, variants)
+
+    def _precompressed(self, full_path, encoding):
+        variant_path = full_path + SUFFIXES[encoding]
+        try:
+            if os.path.getmtime(variant_path) < os.path.getmtime(full_path):
+                return None
+            with open(variant_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _compress(self, data, encoding):
+        if encoding == 'gzip':
+            return gzip.compress(data, compresslevel=9, mtime=0)
+        if encoding == 'br' and brotli is not None:
+            return brotli.compress(data, quality=11)
+        return None
+
+    def response(self, path, request):
+        """Response for path, falling back to the SPA index; None if neither exists"""
+        asset = self.assets.get(path) if path else None
+        if asset is None:
+            asset = self.assets.get(self.index)
+            if asset is None:
+                return None
+
+        encoding = 'identity'
+        for candidate in ENCODINGS:
+            if candidate in asset.variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+        etag = asset.etag if encoding == 'identity' else f'{asset.etag}-{encoding}'
+
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': asset.cache_control,
+            'Vary': 'Accept-Encoding'
+        }
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+
+        body = asset.variants[encoding]
+        if body is None:
+            response = Response(_read_file(asset.path), content_type=asset.content_type, headers=headers)
+            response.content_length = os.path.getsize(asset.path)
+            return response
+        return Response(body, content_type=asset.content_type, headers=headers)
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(256 * 1024), b'')
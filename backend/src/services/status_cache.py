@@ -0,0 +1,349 @@
+"""Incrementally maintained, in-memory repository status.
+
+Each active repository gets a background watcher that records which worktree
+paths changed since the last status call. A status request then re-examines
+only those paths with a pathspec-limited ``git status`` and patches the cached
+result, so its cost follows the number of changed files rather than the size
+of the checkout.
+
+Watching uses watchdog (inotify on Linux) when it is installed and falls back
+to a polling thread that diffs a stat cache of the worktree otherwise. Polling
+re-stats the whole worktree every interval, so it is logged as a warning.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from src.services.status_engine import read_status
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover - optional dependency
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+STATUS_FIELDS = ('modified_files', 'untracked_files', 'staged_files')
+
+
+def _fill_ahead_behind(repo, status, counter):
+    """Set status['ahead_behind'] from counter(repo, head_sha, upstream)"""
+    if counter is not None and status['head_sha'] and status['upstream']:
+        status['ahead_behind'] = counter(repo, status['head_sha'], status['upstream'])
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Forward watchdog events for worktree paths to a RepoWatcher"""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        self.watcher.path_touched(event.src_path)
+        dest_path = getattr(event, 'dest_path', None)
+        if dest_path:
+            self.watcher.path_touched(dest_path)
+
+
+class RepoWatcher:
+    """Stat cache, dirty set and cached status for a single repository"""
+
+    def __init__(self, local_path, poll_interval=2.0, partial_limit=512, use_inotify=True):
+        self.local_path = os.path.realpath(local_path)
+        self.git_dir = os.path.join(self.local_path, '.git')
+        self.poll_interval = poll_interval
+        self.partial_limit = partial_limit
+        self.last_used = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._stat_cache = {}
+        self._dirty = set()
+        self._status = None
+        self._metadata = None
+        # Bumped whenever the cached status changes; with the watcher's id it
+        # names one status snapshot (an ETag for status responses)
+        self._watcher_id = uuid.uuid4().hex[:8]
+        self._generation = 0
+        self._observer = None
+        self._stop_event = threading.Event()
+        self._poll_thread = None
+
+        fallback_reason = None
+        if use_inotify and Observer is None:
+            fallback_reason = 'watchdog is not installed'
+        elif use_inotify:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_EventHandler(self), self.local_path, recursive=True)
+                self._observer.daemon = True
+                self._observer.start()
+            except OSError as e:
+                # e.g. fs.inotify.max_user_watches exhausted
+                self._observer = None
+                fallback_reason = str(e)
+        if self._observer is None:
+            if fallback_reason:
+                logger.warning(
+                    'Watching %s by polling (%s): the whole worktree is re-scanned every %ss',
+                    self.local_path, fallback_reason, self.poll_interval
+                )
+            # Baseline before the first status so no change slips in between
+            self._stat_cache = self._scan()
+            self._poll_thread = threading.Thread(target=self._poll_loop, daemon=True)
+            self._poll_thread.start()
+
+    @property
+    def mode(self):
+        return 'inotify' if self._observer is not None else 'polling'
+
+    def stop(self):
+        """Stop watching the worktree"""
+        self._stop_event.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def path_touched(self, path):
+        """Record a filesystem event for an absolute path"""
+        rel_path = self._relative(path)
+        if rel_path is None:
+            return
+        stat_key = _stat_key(path)
+        with self._lock:
+            if stat_key is not None and self._stat_cache.get(rel_path) == stat_key:
+                # open/close or attribute events that didn't change content
+                return
+            if stat_key is None:
+                self._stat_cache.pop(rel_path, None)
+            else:
+                self._stat_cache[rel_path] = stat_key
+            self._dirty.add(rel_path)
+
+    def mark_changed(self, rel_paths):
+        """Mark worktree paths as changed by our own writes"""
+        with self._lock:
+            for rel_path in rel_paths:
+                rel_path = os.path.normpath(rel_path).replace(os.sep, '/')
+                self._dirty.add(rel_path)
+                self._stat_cache[rel_path] = _stat_key(os.path.join(self.local_path, rel_path))
+
+    def acknowledge_metadata(self):
+        """Accept the current .git metadata as produced by our own operation"""
+        with self._lock:
+            if self._status is not None:
+                self._metadata = self._metadata_signature()
+
+    def invalidate(self):
+        """Drop the cached status so the next call does a full scan"""
+        with self._lock:
+            self._status = None
+            self._dirty.clear()
+
+    def get_status(self, repo, ahead_behind=None):
+        """Return the repository status, rescanning only what changed
+
+        ahead_behind(repo, head_sha, upstream) counts the tracking branch
+        divergence; it only needs recounting when HEAD or refs moved, which
+        always goes through a full rescan here.
+        """
+        self.last_used = time.monotonic()
+        with self._lock:
+            metadata = self._metadata_signature()
+            previous = self._status
+            if self._status is None or metadata != self._metadata or len(self._dirty) > self.partial_limit:
+                self._dirty.clear()
+                self._status = self._to_sets(read_status(repo))
+                _fill_ahead_behind(repo, self._status, ahead_behind)
+                if self._status != previous:
+                    self._generation += 1
+            elif self._dirty:
+                paths = sorted(self._dirty)
+                self._dirty.clear()
+                self._merge(paths, read_status(repo, paths))
+                # Touched paths almost always mean a changed status; a spare
+                # bump only costs a client one full response
+                self._generation += 1
+            self._metadata = metadata
+            result = self._to_lists(self._status)
+            result['etag'] = self._current_etag()
+            return result
+
+    def etag(self):
+        """Tag of the status a get_status call would return now, if known without git.
+
+        None when paths or .git metadata changed since the last call, i.e.
+        when the status has to be recomputed to know whether it changed.
+        """
+        with self._lock:
+            if self._status is None or self._dirty or self._metadata_signature() != self._metadata:
+                return None
+            return self._current_etag()
+
+    def _current_etag(self):
+        return f"{self._status['head_sha'] or 'unborn'}.{self._watcher_id}.{self._generation}"
+
+    def _merge(self, paths, partial):
+        status = self._status
+        prefixes = tuple(path + '/' for path in paths if not os.path.isfile(os.path.join(self.local_path, path)))
+        for field in STATUS_FIELDS:
+            entries = status[field]
+            entries.difference_update(paths)
+            if prefixes:
+                entries.difference_update([entry for entry in entries if entry.startswith(prefixes)])
+            entries.update(partial[field])
+        for key in ('branch', 'head_sha', 'upstream'):
+            status[key] = partial[key]
+        status['is_dirty'] = bool(status['modified_files'] or status['staged_files'])
+
+    def _to_sets(self, status):
+        for field in STATUS_FIELDS:
+            status[field] = set(status[field])
+        return status
+
+    def _to_lists(self, status):
+        result = dict(status)
+        for field in STATUS_FIELDS:
+            result[field] = sorted(status[field])
+        result['ahead_behind'] = dict(status['ahead_behind'])
+        return result
+
+    def _relative(self, path):
+        path = os.path.realpath(path)
+        if path == self.git_dir or path.startswith(self.git_dir + os.sep):
+            # .git changes are detected through the metadata signature
+            return None
+        if not path.startswith(self.local_path + os.sep):
+            return None
+        return os.path.relpath(path, self.local_path).replace(os.sep, '/')
+
+    def _metadata_signature(self):
+        """Cheap fingerprint of HEAD, the index and refs"""
+        signature = [
+            _stat_key(os.path.join(self.git_dir, name))
+            for name in ('HEAD', 'index', 'packed-refs')
+        ]
+        for root, _, files in os.walk(os.path.join(self.git_dir, 'refs')):
+            for name in files:
+                signature.append((name, _stat_key(os.path.join(root, name))))
+        return tuple(signature)
+
+    def _scan(self):
+        """Walk the worktree and return {relative path: stat key}"""
+        snapshot = {}
+        stack = [self.local_path]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name == '.git' and directory == self.local_path:
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                                continue
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        rel_path = os.path.relpath(entry.path, self.local_path).replace(os.sep, '/')
+                        snapshot[rel_path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                continue
+        return snapshot
+
+    def _poll_loop(self):
+        while not self._stop_event.wait(self.poll_interval):
+            snapshot = self._scan()
+            with self._lock:
+                previous = self._stat_cache
+                for rel_path, stat_key in snapshot.items():
+                    if previous.get(rel_path) != stat_key:
+                        self._dirty.add(rel_path)
+                self._dirty.update(rel_path for rel_path in previous if rel_path not in snapshot)
+                self._stat_cache = snapshot
+
+
+class StatusCache:
+    """Registry of RepoWatchers for repositories under a base directory"""
+
+    def __init__(self, base_dir, idle_timeout=600, **watcher_options):
+        self.base_dir = os.path.realpath(base_dir)
+        self.idle_timeout = idle_timeout
+        self.watcher_options = watcher_options
+        self._watchers = {}
+        self._lock = threading.Lock()
+
+    def get_status(self, repo, local_path, ahead_behind=None):
+        """Return cached status for local_path, starting a watcher if needed"""
+        watcher = self._watcher(local_path, create=True)
+        if watcher is None:
+            status = read_status(repo)
+            _fill_ahead_behind(repo, status, ahead_behind)
+            return status
+        return watcher.get_status(repo, ahead_behind)
+
+    def etag(self, local_path):
+        """Tag of local_path's current status if it is known to be unchanged, else None"""
+        watcher = self._watcher(local_path)
+        return watcher.etag() if watcher is not None else None
+
+    def mark_changed(self, local_path, rel_paths):
+        watcher = self._watcher(local_path)
+        if watcher is not None:
+            watcher.mark_changed(rel_paths)
+
+    def acknowledge_metadata(self, local_path):
+        watcher = self._watcher(local_path)
+        if watcher is not None:
+            watcher.acknowledge_metadata()
+
+    def invalidate(self, local_path):
+        watcher = self._watcher(local_path)
+        if watcher is not None:
+            watcher.invalidate()
+
+    def discard(self, local_path):
+        """Stop watching local_path, e.g. before deleting it"""
+        with self._lock:
+            watcher = self._watchers.pop(os.path.realpath(local_path), None)
+        if watcher is not None:
+            watcher.stop()
+
+    def stop_all(self):
+        with self._lock:
+            watchers = list(self._watchers.values())
+            self._watchers.clear()
+        for watcher in watchers:
+            watcher.stop()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'watched_repositories': len(self._watchers),
+                'modes': sorted({watcher.mode for watcher in self._watchers.values()})
+            }
+
+    def _watcher(self, local_path, create=False):
+        key = os.path.realpath(local_path)
+        idle = []
+        with self._lock:
+            cutoff = time.monotonic() - self.idle_timeout
+            for path, watcher in list(self._watchers.items()):
+                if path != key and watcher.last_used < cutoff:
+                    idle.append(self._watchers.pop(path))
+            watcher = self._watchers.get(key)
+            if watcher is None and create and key.startswith(self.base_dir + os.sep):
+                watcher = self._watchers[key] = RepoWatcher(key, **self.watcher_options)
+        for stale in idle:
+            stale.stop()
+        return watcher
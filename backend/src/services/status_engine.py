@@ -0,0 +1,130 @@
+"""Single-pass repository status built on ``git status --porcelain=v2``.
+
+One ``git status`` invocation stats the worktree once and reports the index,
+worktree, untracked and branch tracking state together, instead of the
+separate ``index.diff(None)``, ``untracked_files``, ``index.diff("HEAD")``,
+``is_dirty()`` and ``iter_commits`` sweeps GitPython would otherwise do.
+"""
+
+# --no-optional-locks keeps status from rewriting .git/index, which would
+# otherwise look like an external index change to the status cache.
+# --no-ahead-behind skips the tracking-branch walk on every call; callers count
+# it separately, memoized on the two tip SHAs (GitManager._upstream_counts)
+STATUS_ARGS = [
+    '--no-optional-locks', 'status', '--porcelain=v2', '-z', '--branch', '--no-ahead-behind',
+    '--untracked-files=all'
+]
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_records(chunks):
+    """Yield NUL-terminated records from an iterable of byte chunks"""
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find(b'\0', start)
+            if end == -1:
+                break
+            yield pending[start:end]
+            start = end + 1
+        pending = pending[start:]
+    if pending:
+        yield pending
+
+
+def iter_stream(stream, chunk_size=READ_CHUNK_SIZE):
+    """Yield fixed-size chunks from a binary stream until EOF"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _decode(raw):
+    return raw.decode('utf-8', 'surrogateescape')
+
+
+def parse_status(chunks):
+    """Parse porcelain v2 ``-z --branch`` output into the status fields.
+
+    Entries are consumed one record at a time as they arrive; only the result
+    lists exposed by the status endpoint are accumulated.
+    """
+    status = {
+        'branch': None,
+        'head_sha': None,
+        'upstream': None,
+        'modified_files': [],
+        'untracked_files': [],
+        'staged_files': [],
+        'is_dirty': False,
+        'ahead_behind': {'ahead': 0, 'behind': 0}
+    }
+    modified = status['modified_files']
+    untracked = status['untracked_files']
+    staged = status['staged_files']
+
+    records = iter_records(chunks)
+    for record in records:
+        if not record:
+            continue
+        kind = record[:1]
+
+        if kind == b'#':
+            _parse_header(record, status)
+        elif kind == b'1' or kind == b'2':
+            # 1 XY sub mH mI mW hH hI path
+            # 2 XY sub mH mI mW hH hI Xscore path, followed by a NUL and the original path
+            fields = record.split(b' ', 8 if kind == b'1' else 9)
+            xy = fields[1]
+            path = _decode(fields[-1])
+            if xy[:1] != b'.':
+                staged.append(path)
+            if xy[1:2] != b'.':
+                modified.append(path)
+            if kind == b'2':
+                next(records, None)
+        elif kind == b'u':
+            # Unmerged paths differ from both HEAD and the worktree
+            path = _decode(record.split(b' ', 10)[-1])
+            staged.append(path)
+            modified.append(path)
+        elif kind == b'?':
+            untracked.append(_decode(record[2:]))
+
+    status['is_dirty'] = bool(modified or staged)
+    return status
+
+
+def _parse_header(record, status):
+    key, _, value = _decode(record[2:]).partition(' ')
+    if key == 'branch.oid':
+        status['head_sha'] = None if value == '(initial)' else value
+    elif key == 'branch.head':
+        status['branch'] = value
+    elif key == 'branch.upstream':
+        status['upstream'] = value
+    elif key == 'branch.ab' and '?' not in value:
+        ahead, behind = value.split(' ')
+        status['ahead_behind'] = {'ahead': int(ahead), 'behind': abs(int(behind))}
+
+
+def read_status(repo, paths=None):
+    """Run one porcelain v2 status in repo and return the parsed fields.
+
+    When paths is given only those worktree paths (files or directories) are
+    examined; branch and tracking headers are always reported in full.
+    """
+    command = ['git'] + STATUS_ARGS
+    if paths is not None:
+        command.append('--')
+        command.extend(':(literal)' + path for path in paths)
+    proc = repo.git.execute(command, as_process=True)
+    try:
+        status = parse_status(iter_stream(proc.stdout))
+    finally:
+        proc.wait()
+    return status
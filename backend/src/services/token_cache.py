@@ -0,0 +1,147 @@
+"""Cache of GitHub token validation and permission lookups.
+
+Entries are keyed by an HMAC of the token under a secret salt, so neither the
+token nor a plain hash of it is ever stored. By default entries live in
+process memory. Setting GITEASY_TOKEN_CACHE_DB to a SQLite file replaces that
+with a table shared by every worker process on the host (it also holds the
+shared salt), so invalidating a token in one worker, e.g. after a rejected
+push, takes effect in all of them. A lookup there is a primary-key read.
+"""
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from src.services.ttl_cache import TTLCache
+
+DEFAULT_TTLS = {
+    'validate': 300,
+    'permissions': 60
+}
+# Fragments of git's stderr when the remote rejected our credentials
+AUTH_ERROR_MARKERS = (
+    'authentication failed',
+    'could not read username',
+    'invalid username or password',
+    'permission to',
+    'the requested url returned error: 401',
+    'the requested url returned error: 403'
+)
+
+
+def is_auth_error(message):
+    message = (message or '').lower()
+    return any(marker in message for marker in AUTH_ERROR_MARKERS)
+
+
+class TokenCache:
+    """TTL cache of per-token lookups, optionally shared through SQLite"""
+
+    def __init__(self, ttls=None, db_path=None, max_entries=4096):
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.db_path = db_path
+        self._memory = TTLCache(max(self.ttls.values()), max_entries=max_entries)
+        self._local = threading.local()
+        self._salt = None
+        self._salt_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        ttls = {}
+        for kind in DEFAULT_TTLS:
+            value = os.environ.get(f'GITEASY_TOKEN_{kind.upper()}_TTL')
+            if value:
+                ttls[kind] = int(value)
+        return cls(ttls=ttls, db_path=os.environ.get('GITEASY_TOKEN_CACHE_DB'))
+
+    def digest(self, token):
+        """Salted, non-reversible identifier for token"""
+        return hmac.new(self._get_salt(), token.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def get(self, kind, token, subject=''):
+        digest = self.digest(token)
+        if not self.db_path:
+            return self._memory.get((digest, kind, subject))
+
+        # No memory tier in front: another worker may have invalidated the token
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM token_cache WHERE digest = ? AND kind = ? AND subject = ?',
+            (digest, kind, subject)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, kind, token, value, subject=''):
+        digest = self.digest(token)
+        ttl = self.ttls[kind]
+        if not self.db_path:
+            self._memory.set((digest, kind, subject), value, ttl=ttl)
+        else:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO token_cache (digest, kind, subject, value, expires_at) VALUES (?, ?, ?, ?, ?)',
+                    (digest, kind, subject, json.dumps(value), time.time() + ttl)
+                )
+                # Expired rows are otherwise never read again
+                connection.execute('DELETE FROM token_cache WHERE expires_at <= ?', (time.time(),))
+
+    def invalidate(self, token):
+        """Forget everything cached for token"""
+        if not token:
+            return
+        digest = self.digest(token)
+        if not self.db_path:
+            self._memory.discard_where(lambda key: key[0] == digest)
+        else:
+            connection = self._connection()
+            with connection:
+                connection.execute('DELETE FROM token_cache WHERE digest = ?', (digest,))
+
+    def _get_salt(self):
+        if self._salt is not None:
+            return self._salt
+        with self._salt_lock:
+            if self._salt is None:
+                configured = os.environ.get('GITEASY_TOKEN_SALT')
+                if configured:
+                    self._salt = configured.encode('utf-8')
+                elif self.db_path:
+                    self._salt = self._shared_salt()
+                else:
+                    self._salt = secrets.token_bytes(32)
+            return self._salt
+
+    def _shared_salt(self):
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO token_cache_meta (name, value) VALUES ('salt', ?)",
+                (secrets.token_hex(32),)
+            )
+        return connection.execute("SELECT value FROM token_cache_meta WHERE name = 'salt'").fetchone()[0].encode('ascii')
+
+    def _connection(self):
+        # sqlite3 connections stay on the thread that opened them
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=15)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS token_cache ('
+                    'digest TEXT NOT NULL, kind TEXT NOT NULL, subject TEXT NOT NULL, '
+                    'value TEXT NOT NULL, expires_at REAL NOT NULL, '
+                    'PRIMARY KEY (digest, kind, subject))'
+                )
+                connection.execute('CREATE TABLE IF NOT EXISTS token_cache_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self._local.connection = connection
+        return connection
+
+
+token_cache = TokenCache.from_env()
@@ -0,0 +1,71 @@
+"""Write blobs and trees straight into a repository's object database.
+
+Used to commit uploaded files without a worktree or index: blobs are
+streamed into the loose object store, and a new root tree is derived from the
+parent tree by rewriting only the directories on the path to a changed file.
+Every other subtree is reused by SHA.
+"""
+import stat
+from io import BytesIO
+from gitdb import IStream
+from git.objects.fun import tree_entries_from_data, tree_to_stream
+
+FILE_MODE = 0o100644
+EXECUTABLE_MODE = 0o100755
+TREE_MODE = 0o040000
+
+
+def store_blob(repo, size, stream):
+    """Stream size bytes from stream into the object database; return binsha"""
+    return repo.odb.store(IStream('blob', size, stream)).binsha
+
+
+def _read_tree(repo, binsha):
+    if binsha is None:
+        return {}
+    data = repo.odb.stream(binsha).read()
+    return {name: (sha, mode) for sha, mode, name in tree_entries_from_data(data)}
+
+
+def _write_tree(repo, entries):
+    # Git orders tree entries as if directory names had a trailing slash
+    ordered = sorted(
+        ((sha, mode, name) for name, (sha, mode) in entries.items()),
+        key=lambda entry: entry[2] + '/' if stat.S_ISDIR(entry[1]) else entry[2]
+    )
+    buffer = BytesIO()
+    tree_to_stream(ordered, buffer.write)
+    size = buffer.tell()
+    buffer.seek(0)
+    return repo.odb.store(IStream('tree', size, buffer)).binsha
+
+
+def build_tree(repo, base_tree_binsha, changes):
+    """Return the binsha of base_tree with changes applied.
+
+    changes maps '/'-separated paths to blob binshas. A file keeps the
+    executable bit of the entry it replaces; a file replacing a directory (or
+    the reverse) replaces that entry outright.
+    """
+    entries = _read_tree(repo, base_tree_binsha)
+
+    files = {}
+    subdirs = {}
+    for path, blob_binsha in changes.items():
+        name, _, rest = path.partition('/')
+        if rest:
+            subdirs.setdefault(name, {})[rest] = blob_binsha
+        else:
+            files[name] = blob_binsha
+
+    for name, blob_binsha in files.items():
+        existing = entries.get(name)
+        mode = EXECUTABLE_MODE if existing and existing[1] == EXECUTABLE_MODE else FILE_MODE
+        entries[name] = (blob_binsha, mode)
+
+    for name, sub_changes in subdirs.items():
+        existing = entries.get(name)
+        base = existing[0] if existing and stat.S_ISDIR(existing[1]) else None
+        entries[name] = (build_tree(repo, base, sub_changes), TREE_MODE)
+
+    return _write_tree(repo, entries)
@@ -0,0 +1,118 @@
+"""Helpers for writing uploaded files into a checkout only when they changed.
+
+Each upload is hashed the way git hashes a blob, so it can be compared with
+the index entry for the same path before anything touches the worktree.
+Unchanged files keep their mtime, which keeps the next status call cheap.
+"""
+import hashlib
+import os
+import stat
+import tempfile
+from src.services.status_engine import iter_records, iter_stream
+
+CHUNK_SIZE = 256 * 1024
+PATHSPEC_BATCH_SIZE = 500
+
+
+def _current_umask():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+    # Not thread-safe, but this runs once, at import
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+
+UMASK = _current_umask()
+
+
+def safe_relative_path(local_path, filename):
+    """Normalize an uploaded filename, rejecting paths outside the checkout"""
+    rel_path = os.path.normpath(filename.replace('\\', '/')).replace(os.sep, '/')
+    if os.path.isabs(rel_path) or rel_path in ('.', '..') or rel_path.startswith('../') or rel_path.split('/')[0] == '.git':
+        raise ValueError(f'Invalid upload path: {filename}')
+    return rel_path
+
+
+def seekable_upload(stream):
+    """Return (size, seekable stream) for an uploaded file stream"""
+    if not stream.seekable():
+        spooled = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        for chunk in iter_stream(stream, CHUNK_SIZE):
+            spooled.write(chunk)
+        stream = spooled
+
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+    return size, stream
+
+
+def hash_upload(stream):
+    """Return (blob sha, size, seekable stream) for an uploaded file stream"""
+    size, stream = seekable_upload(stream)
+    hasher = hashlib.sha1(b'blob %d\0' % size)
+    for chunk in iter_stream(stream, CHUNK_SIZE):
+        hasher.update(chunk)
+    stream.seek(0)
+    return hasher.hexdigest(), size, stream
+
+
+def write_upload(stream, target_path):
+    """Stream an upload to target_path in chunks via an atomic rename.
+
+    A replaced file keeps its mode (e.g. an executable bit); a new one gets
+    the umask's, as a plain open() would give it.
+    """
+    directory = os.path.dirname(target_path)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode = stat.S_IMODE(os.stat(target_path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~UMASK
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.giteasy-upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            # mkstemp creates the file 0600
+            os.fchmod(out.fileno(), mode)
+            for chunk in iter_stream(stream, CHUNK_SIZE):
+                out.write(chunk)
+        os.replace(temp_path, target_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def index_blobs(repo, rel_paths):
+    """Map each of rel_paths that is in the index (stage 0) to its blob sha"""
+    wanted = set(rel_paths)
+    entries = {}
+    proc = repo.git.execute(['git', 'ls-files', '--stage', '-z'], as_process=True)
+    try:
+        for record in iter_records(iter_stream(proc.stdout)):
+            # <mode> <sha> <stage>\t<path>
+            meta, _, path = record.partition(b'\t')
+            path = path.decode('utf-8', 'surrogateescape')
+            if path in wanted:
+                _, sha, stage = meta.split(b' ')
+                if stage == b'0':
+                    entries[path] = sha.decode('ascii')
+    finally:
+        proc.wait()
+    return entries
+
+
+def worktree_changed(repo, rel_paths):
+    """Subset of rel_paths whose worktree file differs from the index"""
+    changed = set()
+    rel_paths = list(rel_paths)
+    for start in range(0, len(rel_paths), PATHSPEC_BATCH_SIZE):
+        batch = rel_paths[start:start + PATHSPEC_BATCH_SIZE]
+        output = repo.git.diff_files('--name-only', '-z', '--', *[':(literal)' + p for p in batch])
+        changed.update(path for path in output.split('\0') if path)
+    return changed
@@ -0,0 +1,7 @@
+"""WSGI entry point for production servers.
+
+From backend/: ``gunicorn -c gunicorn.conf.py src.wsgi:app``
+"""
+from src.main import create_app
+
+app = create_app()
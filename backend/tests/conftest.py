@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Same layout as src/main.py: the backend directory is the import root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,102 @@
+"""Concurrent writers against the tuned SQLite database.
+
+Several processes, each with several threads, reconcile pending file
+changes and record commits against one WAL database at the same time. None
+of them may hit 'database is locked'.
+"""
+import logging
+import multiprocessing
+import os
+import random
+import threading
+
+PROCESSES = 4
+THREADS = 4
+ROUNDS = 25
+
+
+def _create_app(db_path):
+    os.environ['GITEASY_DATABASE_URL'] = f'sqlite:///{db_path}'
+    from src.main import create_app
+    return create_app({'GITEASY_DEFER_BACKGROUND': True})
+
+
+class _Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+def _writer_process(db_path, repository_id, seed, results):
+    from src.models import db
+    from src.models.repository import CommitHistory
+    from src.routes.git_routes import _update_pending_changes
+
+    app = _create_app(db_path)
+    # _update_pending_changes logs and swallows its errors
+    collected = _Collect()
+    app.logger.addHandler(collected)
+    errors = []
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        with app.app_context():
+            for _ in range(ROUNDS):
+                paths = [f'dir/file{rng.randrange(300)}.txt' for _ in range(150)]
+                _update_pending_changes(repository_id, {
+                    'modified_files': paths[:50],
+                    'staged_files': paths[50:100],
+                    'untracked_files': paths[100:]
+                })
+                try:
+                    db.session.add(CommitHistory(
+                        repository_id=repository_id, commit_hash=f'{rng.getrandbits(160):040x}',
+                        message='stress', author='test'
+                    ))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(str(e))
+            db.session.remove()
+
+    threads = [threading.Thread(target=run, args=(seed * 100 + index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(errors + collected.messages)
+
+
+def test_concurrent_writers_never_see_locked_database(tmp_path):
+    db_path = str(tmp_path / 'stress.db')
+    app = _create_app(db_path)
+    from src.models import db
+    from src.models.repository import CommitHistory, Repository
+    with app.app_context():
+        assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+        repository = Repository(name='stress', github_url='https://github.com/o/stress', local_path='/tmp/stress')
+        db.session.add(repository)
+        db.session.commit()
+        repository_id = repository.id
+        db.engine.dispose()
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [
+        context.Process(target=_writer_process, args=(db_path, repository_id, seed, results))
+        for seed in range(PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    errors = [error for _ in processes for error in results.get(timeout=300)]
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    assert not [error for error in errors if 'locked' in error], errors[:3]
+    assert not errors, errors[:3]
+    with app.app_context():
+        assert CommitHistory.query.count() == PROCESSES * THREADS * ROUNDS
@@ -0,0 +1,52 @@
+"""Tampered cursors on the keyset-paginated routes are rejected with 400."""
+import pytest
+
+from src.services.pagination import encode_cursor
+
+MALFORMED = ['not-base64!', encode_cursor({'a': 1}), encode_cursor(None), encode_cursor([]), encode_cursor([1, 2, 3])]
+# Well-formed JSON lists of the wrong shape for each route's sort key
+WRONG_SHAPE = {
+    '/api/repositories': [['x'], [True], [None], ['2024-01-01T00:00:00', 1]],
+    '/api/repositories/{id}/history': [[1], [1, 1], ['not a timestamp', 1], ['2024-01-01T00:00:00', 'x']],
+    '/api/repositories/{id}/changes': [['x'], [1.5], [{'a': 1}], ['2024-01-01T00:00:00', 1]]
+}
+TAMPERED = [
+    (route, cursor)
+    for route, shapes in WRONG_SHAPE.items()
+    for cursor in MALFORMED + [encode_cursor(shape) for shape in shapes]
+]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('GITEASY_DATABASE_URL', f'sqlite:///{tmp_path / "pagination.db"}')
+    from src.main import create_app
+    from src.models import db
+    from src.models.repository import Repository
+
+    app = create_app({'GITEASY_DEFER_BACKGROUND': True})
+    with app.app_context():
+        repository = Repository(name='paged', github_url='https://github.com/o/paged', local_path=str(tmp_path))
+        db.session.add(repository)
+        db.session.commit()
+        repository_id = repository.id
+    client = app.test_client()
+    client.repository_id = repository_id
+    return client
+
+
+@pytest.mark.parametrize('route, cursor', TAMPERED)
+def test_tampered_cursor_is_rejected(client, route, cursor):
+    response = client.get(route.format(id=client.repository_id), query_string={'after': cursor})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid pagination cursor'
+
+
+@pytest.mark.parametrize('route, cursor', [
+    ('/api/repositories', [0]),
+    ('/api/repositories/{id}/history', ['2999-01-01T00:00:00', 0]),
+    ('/api/repositories/{id}/changes', [0])
+])
+def test_valid_cursor_is_accepted(client, route, cursor):
+    response = client.get(route.format(id=client.repository_id), query_string={'after': encode_cursor(cursor)})
+    assert response.status_code == 200
@@ -0,0 +1,108 @@
+"""Startup cost of the app factory and of gunicorn workers.
+
+create_app() must stay cheap to import and build: GitPython and requests are
+only loaded on first use. Under gunicorn.conf.py each forked worker should
+stay small, since most of its memory is shared with the preloaded master.
+"""
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_CREATE_APP_SECONDS = 3.0
+MAX_WORKER_RSS_MB = 128
+WORKERS = 2
+
+CREATE_APP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from src.main import create_app
+create_app()
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    'seconds': elapsed,
+    'git': 'git' in sys.modules,
+    'requests': 'requests' in sys.modules
+}))
+"""
+
+
+def _environment(tmp_path, **extra):
+    env = dict(os.environ)
+    env['GITEASY_DATABASE_URL'] = f'sqlite:///{tmp_path / "startup.db"}'
+    env['GITEASY_DEFER_BACKGROUND'] = '1'
+    env.update(extra)
+    return env
+
+
+def _rss_mb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    raise AssertionError(f'No VmRSS for {pid}')
+
+
+def _worker_pids(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_create_app_is_fast_and_lazy(tmp_path):
+    output = subprocess.run(
+        [sys.executable, '-c', CREATE_APP_SCRIPT],
+        cwd=BACKEND_DIR, env=_environment(tmp_path), capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    print(f"create_app(): {result['seconds']:.3f}s")
+
+    assert not result['git'], 'GitPython was imported at startup'
+    assert not result['requests'], 'requests was imported at startup'
+    assert result['seconds'] < MAX_CREATE_APP_SECONDS
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='reads worker memory from /proc')
+@pytest.mark.skipif(shutil.which('gunicorn') is None, reason='gunicorn is not installed')
+def test_gunicorn_worker_memory(tmp_path):
+    port = _free_port()
+    env = _environment(tmp_path, GITEASY_BIND=f'127.0.0.1:{port}', GITEASY_WORKERS=str(WORKERS))
+    master = subprocess.Popen(
+        ['gunicorn', '-c', 'gunicorn.conf.py', 'src.wsgi:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/repositories', timeout=2) as response:
+                    assert response.status == 200
+                break
+            except OSError:
+                if time.monotonic() > deadline or master.poll() is not None:
+                    raise
+                time.sleep(0.2)
+        # Let every worker finish post_worker_init
+        time.sleep(1)
+
+        workers = _worker_pids(master.pid)
+        assert len(workers) == WORKERS
+        sizes = [_rss_mb(pid) for pid in workers]
+        print('worker RSS (MiB):', ', '.join(f'{size:.1f}' for size in sizes))
+        assert max(sizes) < MAX_WORKER_RSS_MB
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=30)